@@ -3,15 +3,19 @@
 
 """
 Collect information from an sos report folder and export it in other formats
-on standard output.
+on standard output. See "sosviz-fleet -h" to maintain and query a database of
+many reports.
 """
 
 import argparse
 from importlib import metadata
 import pathlib
 import sys
+import typing
 
 from . import collect, output
+from .output.detail import DETAIL_LEVELS
+from .output.svg import DEFAULT_TIMEOUT
 
 
 def main():
@@ -41,21 +45,92 @@ def main():
         Show debug info.
         """,
     )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="""
+        Report the size reduction of compacted SVG files on standard error.
+        """,
+    )
     parser.add_argument(
         "-f",
         "--format",
-        choices=output.FORMATS.keys(),
-        default=output.DEFAULT_FORMAT,
+        metavar="FORMAT[:PATH]",
+        dest="outputs",
+        type=output_spec,
+        action="append",
+        help=f"""
+        Output format ({', '.join(output.FORMATS)}) and optional file path. Can
+        be specified multiple times to produce several outputs from a single
+        parsing of the report. Outputs without a path are written on standard
+        output (default: {output.DEFAULT_FORMAT}). SVG files are compacted
+        after layout and the svgz format is gzip compressed. The html format splits
+        large graphs into one SVG file per VM, OVS bridge, netns group and NUMA
+        node, written next to PATH, which is mandatory. The csv and parquet
+        formats write one table per entity type in the PATH directory,
+        appending to tables from previous runs.
+        """,
+    )
+    parser.add_argument(
+        "-n",
+        "--netns-summary",
+        action="store_true",
+        help="""
+        Only report network namespace counts grouped by name prefix instead of
+        the details of every namespace interface.
+        """,
+    )
+    parser.add_argument(
+        "-c",
+        "--cache-dir",
+        metavar="DIR",
+        type=pathlib.Path,
         help="""
-        Output format (default: %(default)s).
+        Cache the output of graphviz layouts in DIR, keyed by a hash of the DOT
+        source and output format. Unchanged topologies are not laid out again.
+        """,
+    )
+    parser.add_argument(
+        "-D",
+        "--detail",
+        metavar="LEVEL",
+        type=detail_level,
+        help=f"""
+        Level of detail of graphs ({', '.join(DETAIL_LEVELS)} or a
+        number). Groups of homogeneous elements (ports, interfaces,
+        namespaces, VMs, PCI devices) with at least that many members are
+        collapsed into summary nodes with counts and error indicators
+        (default: full).
+        """,
+    )
+    parser.add_argument(
+        "-t",
+        "--layout-timeout",
+        metavar="SECONDS",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="""
+        Overall time budget of graphviz layouts. The layout engine is chosen
+        from the graph size. When an attempt exceeds its share of the budget,
+        the layout is retried with a cheaper engine and finally with a
+        collapsed graph, which is never interrupted. Use 0 to disable
+        (default: %(default)s).
         """,
     )
     args = parser.parse_args()
     try:
         if not args.path.is_dir():
             raise ValueError(f"'{args.path}': No such directory")
-        report = collect.parse_report(args.path)
-        output.render(report, args.format)
+        report = collect.parse_report(args.path, netns_summary=args.netns_summary)
+        output.render_outputs(
+            report,
+            args.outputs or [(output.DEFAULT_FORMAT, None)],
+            cache_dir=args.cache_dir,
+            detail=args.detail,
+            timeout=args.layout_timeout or None,
+            verbose=args.verbose,
+        )
     except BrokenPipeError:
         pass
     except Exception as e:
@@ -65,5 +140,29 @@ def main():
         sys.exit(1)
 
 
+def output_spec(arg: str) -> tuple:
+    fmt, _, path = arg.partition(":")
+    if fmt not in output.FORMATS:
+        raise argparse.ArgumentTypeError(
+            f"invalid format: '{fmt}' (choose from {', '.join(output.FORMATS)})"
+        )
+    return fmt, pathlib.Path(path) if path else None
+
+
+def detail_level(arg: str) -> typing.Optional[int]:
+    if arg in DETAIL_LEVELS:
+        return DETAIL_LEVELS[arg]
+    try:
+        threshold = int(arg)
+    except ValueError:
+        threshold = 0
+    if threshold < 2:
+        raise argparse.ArgumentTypeError(
+            f"invalid level: '{arg}' (choose from {', '.join(DETAIL_LEVELS)} "
+            "or a number greater than 1)"
+        )
+    return threshold
+
+
 if __name__ == "__main__":
     main()
@@ -1,6 +1,7 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright (c) 2024 Robin Jarry
 
+import collections
 import re
 import typing
 
@@ -17,13 +18,7 @@ def parse_cpu_set(arg: str) -> typing.Set[int]:
         if not item:
             continue
         if HEX_RE.match(item):
-            item = int(item, 16)
-            bit = 0
-            while item != 0:
-                if item & 1:
-                    bit_ids.add(bit)
-                bit += 1
-                item >>= 1
+            bit_ids.update(mask_bits(int(item, 16)))
         elif RANGE_RE.match(item):
             start, end = item.split("-")
             bit_ids.update(range(int(start, 10), int(end, 10) + 1))
@@ -34,18 +29,42 @@ def parse_cpu_set(arg: str) -> typing.Set[int]:
     return bit_ids
 
 
-def hex_mask(bit_ids: typing.Set[int]) -> str:
+def int_mask(bit_ids: typing.Iterable[int]) -> int:
     mask = 0
     for bit in bit_ids:
         mask |= 1 << bit
-    return hex(mask)
+    return mask
+
+
+def mask_bits(mask: int) -> typing.Set[int]:
+    bit_ids = set()
+    bit = 0
+    while mask != 0:
+        if mask & 1:
+            bit_ids.add(bit)
+        bit += 1
+        mask >>= 1
+    return bit_ids
+
+
+def bit_counts(masks: typing.Iterable[int]) -> typing.Dict[int, int]:
+    """
+    Count, for every bit, the number of masks in which it is set. Identical
+    masks are grouped first so that each distinct mask is only decoded once.
+    """
+    counts = collections.Counter()
+    for mask, num in collections.Counter(masks).items():
+        for bit in mask_bits(mask):
+            counts[bit] += num
+    return dict(counts)
+
+
+def hex_mask(bit_ids: typing.Set[int]) -> str:
+    return hex(int_mask(bit_ids))
 
 
 def bit_mask(bit_ids: typing.Set[int]) -> str:
-    mask = 0
-    for bit in bit_ids:
-        mask |= 1 << bit
-    return f"0b{mask:_b}"
+    return f"0b{int_mask(bit_ids):_b}"
 
 
 def bit_list(bit_ids: typing.Set[int]) -> str:
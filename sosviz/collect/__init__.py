@@ -1,24 +1,77 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright (c) 2024 Robin Jarry
 
+import collections.abc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import importlib
+import multiprocessing
+import os
 import pathlib
 import pkgutil
+import threading
+import typing
 
 
 class D(dict):
 
     def __getattr__(self, attr):
+        if attr.startswith("__"):
+            # special methods looked up by pickle and copy, see process_map
+            raise AttributeError(attr)
         return self[attr]
 
     def __setattr__(self, attr, value):
         return self.__setitem__(attr, value)
 
 
-def parse_report(path: pathlib.Path) -> dict:
+class LazyD(collections.abc.Mapping):
+    """
+    Read-only mapping whose items are decoded from raw text on first access.
+    """
+
+    def __init__(self, raw: str, decode: typing.Callable[[str], dict]):
+        self._raw = raw
+        self._decode = decode
+        self._data = None
+
+    @property
+    def data(self) -> D:
+        if self._data is None:
+            self._data = D(self._decode(self._raw))
+            self._raw = None
+        return self._data
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        try:
+            return self.data[attr]
+        except KeyError as e:
+            raise AttributeError(attr) from e
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return repr(self.data)
+
+
+def parse_report(path: pathlib.Path, **opts) -> dict:
     data = D()
-    for collector in discover_collectors():
-        collector.parse_report(path, data)
+    collectors = list(discover_collectors())
+    for collector in collectors:
+        collector.parse_report(path, data, **opts)
+    # cross references between the data of several collectors are resolved
+    # once all of them have run, regardless of their discovery order
+    for collector in collectors:
+        if callable(getattr(collector, "post_collect", None)):
+            collector.post_collect(data)
     return data
 
 
@@ -28,3 +81,53 @@ def discover_collectors():
         if not (hasattr(mod, "parse_report") and callable(mod.parse_report)):
             continue
         yield mod
+
+
+def read_file(f: pathlib.Path) -> typing.Optional[str]:
+    try:
+        return f.read_text()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def read_files(files: typing.List[pathlib.Path]) -> typing.List[typing.Optional[str]]:
+    """
+    Read multiple small files concurrently. The results are returned in the
+    same order as the input list. Missing files are returned as None.
+    """
+    if len(files) < 64:
+        return [read_file(f) for f in files]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        return list(pool.map(read_file, files, chunksize=64))
+
+
+def process_map(
+    func: typing.Callable,
+    items: typing.Iterable,
+    min_items: int = 64,
+    initializer: typing.Optional[typing.Callable] = None,
+    initargs: tuple = (),
+) -> list:
+    """
+    Apply func to all items on a process pool and return the results in
+    order. Below min_items, spawning worker processes is not worth it and
+    the items are processed in the current process.
+
+    Forking a process while other threads are running may leave locks held
+    forever in the children. When called from a multi-threaded process (e.g.
+    when rendering several outputs concurrently), workers are spawned
+    instead and initargs are pickled.
+    """
+    items = list(items)
+    if len(items) < min_items:
+        if initializer is not None:
+            initializer(*initargs)
+        return [func(i) for i in items]
+    context = None
+    if threading.active_count() > 1:
+        context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        mp_context=context, initializer=initializer, initargs=initargs
+    ) as pool:
+        chunksize = max(1, len(items) // (4 * (os.cpu_count() or 1)))
+        return list(pool.map(func, items, chunksize=chunksize))
@@ -0,0 +1,148 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import os
+import pathlib
+import re
+import typing
+
+from . import D
+
+
+ETHTOOL_FILE_RE = re.compile(r"^ethtool_-([Slg])_(.+)$")
+# rx_queue_0_packets (ice, ixgbe, virtio), rx0_packets (mlx5), rx-0.packets (i40e)
+QUEUE_RE = re.compile(r"^(rx|tx)(?:_queue_|-)?(\d+)[_.](.+)$")
+# counter name words that indicate lost or corrupted traffic
+ANOMALY_WORDS = {
+    "bad",
+    "discard",
+    "discards",
+    "drop",
+    "dropped",
+    "drops",
+    "err",
+    "errors",
+    "errs",
+    "fail",
+    "failed",
+    "fifo",
+    "miss",
+    "missed",
+    "no",
+    "overrun",
+    "overruns",
+    "timeout",
+    "timeouts",
+}
+
+
+def parse_report(path: pathlib.Path, data: D, **opts):
+    files = D()
+    try:
+        with os.scandir(path / "sos_commands/networking") as entries:
+            for e in entries:
+                match = ETHTOOL_FILE_RE.match(e.name)
+                if match:
+                    opt, name = match.groups()
+                    files.setdefault(name, D())[opt] = pathlib.Path(e.path)
+    except FileNotFoundError:
+        return
+
+    data.ethtool = D()
+    anomaly = {}
+    for name, f in files.items():
+        dev = data.ethtool[name] = D(name=name)
+        if "S" in f:
+            with f.S.open() as lines:
+                ethtool_stats(dev, lines)
+            ethtool_anomalies(dev, anomaly)
+        if "l" in f:
+            with f.l.open() as lines:
+                dev.channels = ethtool_settings(lines)
+        if "g" in f:
+            with f.g.open() as lines:
+                dev.rings = ethtool_settings(lines)
+
+
+def ethtool_stats(dev: D, lines: typing.Iterable[str]):
+    """
+    Parse "ethtool -S" output. Global counters are stored by name. Per queue
+    counters are stored as lists indexed by queue number.
+    """
+    dev.stats = stats = D()
+    dev.queues = queues = D(rx=D(), tx=D())
+    for line in lines:
+        name, sep, value = line.partition(":")
+        if not sep:
+            continue
+        value = value.strip()
+        if not value.isdigit():
+            # "NIC statistics:" header
+            continue
+        name = name.strip()
+        value = int(value)
+        match = QUEUE_RE.match(name)
+        if match is None:
+            stats[name] = value
+            continue
+        direction, q, counter = match.groups()
+        q = int(q)
+        values = queues[direction].get(counter)
+        if values is None:
+            values = queues[direction][counter] = []
+        if q >= len(values):
+            values.extend([0] * (q + 1 - len(values)))
+        values[q] = value
+    dev.num_queues = max(
+        (len(v) for d in queues.values() for v in d.values()), default=0
+    )
+
+
+def ethtool_anomalies(dev: D, anomaly: dict):
+    """
+    Scan all error/drop counters of a device. Non zero per queue counters are
+    reported with the set of offending queues.
+    """
+
+    def is_anomaly(name: str) -> bool:
+        a = anomaly.get(name)
+        if a is None:
+            a = anomaly[name] = not ANOMALY_WORDS.isdisjoint(re.split(r"[_.-]", name))
+        return a
+
+    dev.errors = D()
+    for name, value in dev.stats.items():
+        if value and is_anomaly(name):
+            dev.errors[name] = value
+
+    dev.queue_errors = D()
+    for direction, counters in dev.queues.items():
+        for counter, values in counters.items():
+            if not is_anomaly(counter) or not any(values):
+                continue
+            dev.queue_errors[f"{direction}_queue_{counter}"] = D(
+                total=sum(values),
+                queues={q for q, v in enumerate(values) if v},
+            )
+
+
+def ethtool_settings(lines: typing.Iterable[str]) -> D:
+    """
+    Parse "ethtool -l" and "ethtool -g" output into maximum and current values.
+    """
+    settings = D()
+    section = None
+    for line in lines:
+        key, sep, value = line.partition(":")
+        if not sep:
+            continue
+        key = key.strip()
+        value = value.strip()
+        if key == "Pre-set maximums":
+            section = settings.setdefault("max", D())
+        elif key == "Current hardware settings":
+            section = settings.setdefault("current", D())
+        elif section is not None and value.isdigit():
+            # pylint: disable-next=unsupported-assignment-operation
+            section[key.lower().replace(" ", "_")] = int(value)
+    return settings
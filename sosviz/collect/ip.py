@@ -1,94 +1,364 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright (c) 2024 Robin Jarry
 
+import os
 import pathlib
 import re
+import typing
 
-from . import D
+from . import D, process_map
 
 
-IFACE_RE = re.compile(
-    r"""
-    ^(?P<index>\d+):\s+(?P<name>[^@:]+?)(?:@(?P<link>[^:]+))?:\s+
-        <(?P<flags>[\w,-]+)>\s+
-        mtu\s+(?P<mtu>\d+)
-        (?:.*?\smaster\s+(?P<master>\S+)\s)?.*\n
-    ^\s+link/ether\s+(?P<mac>[a-f\d:]+)\sbrd\s[a-f\d:]+
-        (?:\s+link-netns(?:id)?\s+(?P<link_netns>\S+))?\s.*\n
-    (?:^\s+
-        (?P<kind>
-            vlan
-            |
-            bridge
-            |
-            bond
-            |
-            veth
-            |
-            vxlan
-            |
-            tun
-            |
-            bond_slave
-            |
-            bridge_slave
-        )\s+
-        (?:
-            protocol\s+\S+\s+id\s+(?P<vlan>\d+)
-            |
-            type\s+(?P<tun_type>\S+)
-            |
-            mode\s+(?P<bond_mode>\S+)
-            |
-            state\s+(?P<slave_state>\S+)
-        )?.*
-    \n)?
-    """,
-    re.VERBOSE | re.MULTILINE,
+HEADER_RE = re.compile(r"^(\d+):\s+([^@:\s]+)(?:@([^:\s]+))?:\s+<([^>]*)>(.*)$")
+VF_RE = re.compile(
+    r"^\s+vf\s+(\d+)\s+(?:link/\w+|MAC)\s+([a-f\d:]+)(?:.*?\bvlan\s+(\d+))?"
 )
-ADDR_RE = re.compile(
-    r"inet6? (?P<addr>(?:\d+(?:\.\d+){3}|[a-f\d:]+)/\d+) .*scope global",
-)
-IFACE_BLOCK_RE = re.compile(r"^\d+:\s.*\n(\s{4}.+\n)+", re.VERBOSE | re.MULTILINE)
+# detail lines that do not start with a link kind
+LINK_ATTR_LINES = {
+    "addrgenmode",
+    "alias",
+    "gso_max_segs",
+    "gso_max_size",
+    "numrxqueues",
+    "numtxqueues",
+    "parentbus",
+    "promiscuity",
+    "prop",
+}
+# address attributes that are followed by a value, everything else is a flag
+ADDR_KEYS = {"brd", "peer", "scope", "metric", "label", "proto"}
 
 
-def parse_report(path: pathlib.Path, data: D):
+def parse_report(path: pathlib.Path, data: D, netns_summary: bool = False, **opts):
     stats = get_netdev_stats(path)
+    devices = get_netdev_devices(path)
     data.interfaces = parse_interfaces(
-        path / "sos_commands/networking/ip_-d_address", path, stats
+        path / "sos_commands/networking/ip_-d_address", stats, devices
     )
     data.netns = D()
-    for ip_addr in path.glob(
-        "sos_commands/networking/namespaces/*/*_ip_-d_address_show"
-    ):
-        netns = re.sub(r"ip_netns_exec_(.*)_ip_-d_address_show", r"\1", ip_addr.name)
-        data.netns[ip_addr.parent.name] = parse_interfaces(ip_addr, path, D())
-    for ip_addr in path.glob(
-        "sos_commands/networking/ip_netns_exec_*_ip*_address_show"
+    namespaces = find_netns(path)
+    if netns_summary:
+        data.netns_summary = summarize_netns(namespaces, devices)
+    else:
+        for name, ifaces in zip(
+            namespaces.keys(), map_netns(parse_netns, namespaces.values(), devices)
+        ):
+            data.netns[name] = ifaces
+
+
+def find_netns(path: pathlib.Path) -> D:
+    """
+    Return the ip address output file of every network namespace, indexed by
+    namespace name. Each directory is only listed once.
+    """
+    namespaces = D()
+    networking = path / "sos_commands/networking"
+    try:
+        with os.scandir(networking / "namespaces") as entries:
+            for e in entries:
+                if not e.is_dir():
+                    continue
+                with os.scandir(e.path) as files:
+                    for f in files:
+                        if f.name.endswith("_ip_-d_address_show"):
+                            namespaces[e.name] = pathlib.Path(f.path)
+    except FileNotFoundError:
+        pass
+    try:
+        with os.scandir(networking) as entries:
+            for e in entries:
+                match = NETNS_FILE_RE.match(e.name)
+                if match:
+                    namespaces[match.group(1)] = pathlib.Path(e.path)
+    except FileNotFoundError:
+        pass
+    return namespaces
+
+
+NETNS_FILE_RE = re.compile(r"^ip_netns_exec_(.*)_ip.*_address_show$")
+NETNS_DEVICES = D()
+
+
+def map_netns(func, files, devices: D) -> typing.List:
+    # the device map is handed over once per worker process, not once per task
+    return process_map(func, files, initializer=set_netns_devices, initargs=(devices,))
+
+
+def set_netns_devices(devices: D):
+    NETNS_DEVICES.clear()
+    NETNS_DEVICES.update(devices)
+
+
+def parse_netns(ip_addr: pathlib.Path) -> D:
+    return parse_interfaces(ip_addr, D(), NETNS_DEVICES)
+
+
+def summarize_netns(namespaces: D, devices: D) -> D:
+    summary = D()
+    for name, kinds in zip(
+        namespaces.keys(), map_netns(netns_kinds, namespaces.values(), devices)
     ):
-        netns = re.sub(r"ip_netns_exec_(.*)_ip.*_address_show", r"\1", ip_addr.name)
-        data.netns[netns] = parse_interfaces(ip_addr, path, D())
+        prefix = name.split("-", 1)[0]
+        s = summary.setdefault(
+            prefix, D(prefix=prefix, namespaces=0, interfaces=0, kinds=D())
+        )
+        s.namespaces += 1
+        for kind, num in kinds.items():
+            s.interfaces += num
+            s.kinds[kind] = s.kinds.get(kind, 0) + num
+    return summary
+
+
+def netns_kinds(ip_addr: pathlib.Path) -> D:
+    kinds = D()
+    for iface in parse_netns(ip_addr).values():
+        kind = iface.get("kind", iface.get("link_type", "other"))
+        kinds[kind] = kinds.get(kind, 0) + 1
+    return kinds
 
 
-def parse_interfaces(ip_addr: pathlib.Path, path: pathlib.Path, stats: D) -> D:
+def parse_interfaces(ip_addr: pathlib.Path, stats: D, devices: D) -> D:
     ifaces = D()
     if not ip_addr.is_file():
         return ifaces
-    for block in IFACE_BLOCK_RE.finditer(ip_addr.read_text()):
-        match = IFACE_RE.search(block.group())
-        if not match:
-            continue
-        d = D({k: v for (k, v) in match.groupdict().items() if v is not None})
-        for dev in path.glob(f"sys/class/net/{d.name}/device"):
-            d.device = dev.resolve().name
-        ifaces[d.name] = d
-        for m in ADDR_RE.finditer(block.group()):
-            d.setdefault("ip", []).append(m.group("addr"))
-        if d.name in stats:
-            d.stats = stats[d.name]
+    with ip_addr.open() as f:
+        for d in tokenize_interfaces(f):
+            if d.name in devices:
+                d.device = devices[d.name]
+            if d.name in stats:
+                d.stats = stats[d.name]
+            ifaces[d.name] = d
     return ifaces
 
 
+def tokenize_interfaces(lines: typing.Iterable[str]) -> typing.Iterator[D]:
+    """
+    Parse "ip -d address show" output line by line. Each interface starts with
+    a non-indented header line, all following indented lines belong to it.
+    """
+    iface = None
+    for line in lines:
+        if not line[:1].isspace():
+            if iface is not None:
+                yield iface
+            iface = None
+            match = HEADER_RE.match(line)
+            if match:
+                iface = parse_header(match)
+            continue
+        if iface is None:
+            continue
+        tokens = line.split(None, 1)
+        if not tokens:
+            continue
+        key = tokens[0]
+        rest = tokens[1] if len(tokens) > 1 else ""
+        if key.startswith("link/"):
+            parse_link(iface, key[len("link/") :], rest)
+        elif key in ("inet", "inet6"):
+            parse_addr(iface, key, rest)
+        elif key == "valid_lft":
+            if "addrs" in iface:
+                iface.addrs[-1].update(parse_pairs(line))
+        elif key == "altname":
+            iface.setdefault("altnames", []).append(rest.strip())
+        elif key == "vf":
+            match = VF_RE.match(line)
+            if match:
+                vf = D(vf=int(match.group(1)), mac=match.group(2))
+                if match.group(3):
+                    vf.vlan = int(match.group(3))
+                iface.setdefault("vfs", []).append(vf)
+        elif key in LINK_ATTR_LINES:
+            iface.details.update(parse_pairs(line))
+        else:
+            parse_kind(iface, key, rest)
+    if iface is not None:
+        yield iface
+
+
+def parse_header(match: re.Match) -> D:
+    index, name, link, flags, rest = match.groups()
+    iface = D(index=index, name=name, flags=flags)
+    if link and link != "NONE":
+        iface.link = link
+    for key, value in parse_pairs(rest).items():
+        if key in ("mtu", "master", "state", "qdisc", "qlen"):
+            iface[key] = value
+    iface.details = D()
+    return iface
+
+
+def parse_link(iface: D, link_type: str, rest: str):
+    iface.link_type = link_type
+    addr, _, attrs = rest.partition(" ")
+    if addr and not addr.isalpha():
+        if link_type == "ether":
+            iface.mac = addr
+        else:
+            iface.link_addr = addr
+        rest = attrs
+    attrs = parse_pairs(rest)
+    for key in "link_netns", "link_netnsid":
+        if key in attrs:
+            iface.link_netns = attrs.pop(key)
+    iface.details.update(attrs)
+
+
+def parse_addr(iface: D, family: str, rest: str):
+    tokens = rest.split()
+    addr = D(family=family, addr=tokens[0])
+    i = 1
+    while i < len(tokens):
+        key = tokens[i]
+        if key in ADDR_KEYS and i + 1 < len(tokens):
+            addr[key] = tokens[i + 1]
+            i += 2
+            continue
+        if key == iface.name or key.startswith(iface.name + ":"):
+            addr.label = key
+        else:
+            addr.setdefault("flags", []).append(key)
+        i += 1
+    iface.setdefault("addrs", []).append(addr)
+    if addr.get("scope") == "global":
+        ip = addr.addr
+        if "peer" in addr:
+            ip += f" peer {addr.peer}"
+        iface.setdefault("ip", []).append(ip)
+
+
+def parse_kind(iface: D, kind: str, rest: str):
+    attrs = parse_pairs(rest)
+    if kind.endswith("_slave"):
+        iface.slave_kind = kind
+        iface.info_slave_data = attrs
+        if "state" in attrs:
+            iface.slave_state = attrs.state
+        return
+    if "kind" in iface:
+        iface.details.update(attrs)
+        return
+    iface.kind = kind
+    iface.info_data = attrs
+    if kind == "vlan" and "id" in attrs:
+        iface.vlan = attrs.id
+    elif kind == "tun" and "type" in attrs:
+        iface.tun_type = attrs.type
+    elif kind == "bond" and "mode" in attrs:
+        iface.bond_mode = attrs.mode
+    elif kind in ("vxlan", "geneve") and "id" in attrs:
+        iface.vni = attrs.id
+
+
+FLAGS_RE = re.compile(r"<([^>]*)>")
+# detail line attributes which are printed without a value
+VALUELESS = frozenset(
+    {
+        "bridge",
+        "encap-csum",
+        "encap-csum6",
+        "encap-remcsum",
+        "external",
+        "gbp",
+        "gpe",
+        "icsum",
+        "ignore-df",
+        "inner_proto_inherit",
+        "iseq",
+        "l2miss",
+        "l3miss",
+        "localbypass",
+        "multi_queue",
+        "noencap-csum",
+        "noencap-csum6",
+        "noencap-remcsum",
+        "noignore-df",
+        "nolearning",
+        "nolocalbypass",
+        "nopmtudisc",
+        "noudp6zerocsumrx",
+        "noudp6zerocsumtx",
+        "noudpcsum",
+        "ocsum",
+        "oseq",
+        "pmtudisc",
+        "private",
+        "proxy",
+        "remcsumrx",
+        "remcsumtx",
+        "rsc",
+        "udp6zerocsumrx",
+        "udp6zerocsumtx",
+        "udpcsum",
+        "vepa",
+        "vnifilter",
+    }
+)
+DIGITS = frozenset("0123456789")
+
+
+def parse_pairs(text: str) -> D:
+    """
+    Convert a "key value key value" string to a dict. Words between angle
+    brackets are stored as flags. Attributes printed without a value are set
+    to True. Keys never start with a digit, such words following a value are
+    more values of the same attribute (e.g. "srcport 0 0") and stored as a
+    list.
+    """
+    attrs = D()
+    if "<" in text:
+        match = FLAGS_RE.search(text)
+        if match:
+            attrs.flags = match.group(1)
+            text = text[: match.start()] + text[match.end() :]
+    tokens = text.split()
+    n = len(tokens)
+    keys = tokens[0::2]
+    # Fast path when all words are key value pairs. Digits and punctuation
+    # sort before letters, the first key which does not start with a letter
+    # is found by min() without a python loop.
+    if n % 2 == 0 and n and VALUELESS.isdisjoint(keys) and min(keys) > "9":
+        if "-" in text:
+            keys = [k.replace("-", "_") for k in keys]
+        attrs.update(zip(keys, tokens[1::2]))
+        return attrs
+    i = 0
+    while i < n:
+        key = tokens[i]
+        i += 1
+        if i == n or key in VALUELESS:
+            value = True
+        else:
+            value = tokens[i]
+            i += 1
+            if i < n and tokens[i][0] in DIGITS:
+                value = [value]
+                while i < n and tokens[i][0] in DIGITS:
+                    value.append(tokens[i])
+                    i += 1
+        if "-" in key:
+            key = key.replace("-", "_")
+        attrs[key] = value
+    return attrs
+
+
+def get_netdev_devices(path: pathlib.Path) -> D:
+    """
+    Resolve the bus device of all network interfaces in a single sysfs pass.
+    """
+    devices = D()
+    try:
+        with os.scandir(path / "sys/class/net") as entries:
+            for e in entries:
+                dev = pathlib.Path(e.path, "device")
+                if dev.exists():
+                    devices[e.name] = dev.resolve().name
+    except FileNotFoundError:
+        pass
+    return devices
+
+
 STATS_RE = re.compile(
     r"""
     ^
@@ -1,33 +1,45 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright (c) 2024 Robin Jarry
 
+import os
 import pathlib
 import re
 
-from . import D
-from ..bits import parse_cpu_set
+from . import D, read_files
+from ..bits import bit_counts, int_mask, parse_cpu_set
 
 
 CPU_RE = re.compile(r"\bCPU(\d+)\b")
 INTERRUPT_RE = re.compile(r"^\s*(\w+):\s+([\s\d]+)\s+([A-Za-z].+)$")
 
 
-def parse_report(path: pathlib.Path, data: D):
+def parse_report(path: pathlib.Path, data: D, **opts):
     data.irqs = irqs = D()
     data.cpus = cpus = D()
-    f = path / "proc/interrupts"
-    if not f.is_file():
-        return
 
     topo_cpu_ids = []
     for cpu in path.glob("sys/devices/system/cpu/cpu[0-9]*"):
         topo_cpu_ids.append(int(re.match(r"cpu(\d+)", cpu.name).group(1)))
+    counters_len = max(topo_cpu_ids, default=-1) + 1
+
+    f = path / "proc/interrupts"
+    if f.is_file():
+        counters_len = interrupts(f, irqs, counters_len)
+        irq_affinities(path, irqs, cpus)
+    # softirqs are reported even when proc/interrupts was not collected
+    data.softirqs = softirqs(path, counters_len)
+
 
-    interrupts = f.read_text().splitlines()
-    irq_cpu_ids = [int(c) for c in CPU_RE.findall(interrupts.pop(0))]
-    counters_len = max(*irq_cpu_ids, *topo_cpu_ids) + 1
+def interrupts(f: pathlib.Path, irqs: D, counters_len: int) -> int:
+    """
+    Parse proc/interrupts into irqs. Return the length of the per-CPU counter
+    lists, large enough for all CPUs of the system.
+    """
+    lines = f.read_text().splitlines()
+    irq_cpu_ids = [int(c) for c in CPU_RE.findall(lines.pop(0))]
+    counters_len = max(counters_len, max(irq_cpu_ids, default=-1) + 1)
 
-    for line in interrupts:
+    for line in lines:
         match = INTERRUPT_RE.match(line)
         if match is None:
             continue
@@ -40,24 +52,75 @@ def parse_report(path: pathlib.Path, data: D):
             desc=re.sub(r"\s+", " ", match.group(3).strip()),
             counters=counters,
         )
-        try:
-            irqs[irq].requested_affinity = parse_cpu_set(
-                (path / f"proc/irq/{irq}/smp_affinity_list").read_text()
-            )
-            for cpu in irqs[irq].requested_affinity:
-                c = cpus.setdefault(cpu, D(cpu=cpu))
-                if "requested_irqs" in c:
-                    c.requested_irqs += 1
-                else:
-                    c.requested_irqs = 1
-            irqs[irq].effective_affinity = parse_cpu_set(
-                (path / f"proc/irq/{irq}/effective_affinity_list").read_text()
-            )
-            for cpu in irqs[irq].effective_affinity:
-                c = cpus.setdefault(cpu, D(cpu=cpu))
-                if "effective_irqs" in c:
-                    c.effective_irqs += 1
-                else:
-                    c.effective_irqs = 1
-        except FileNotFoundError:
-            pass
+
+    return counters_len
+
+
+SOFTIRQ_RE = re.compile(r"^\s*(\w+):((?:\s+\d+)+)\s*$")
+
+
+def softirqs(path: pathlib.Path, counters_len: int) -> D:
+    """
+    Parse proc/softirqs into one list of counters per softirq type, indexed
+    by CPU like the proc/interrupts counters.
+    """
+    counters = D()
+    f = path / "proc/softirqs"
+    if not f.is_file():
+        return counters
+    with f.open() as lines:
+        cpu_ids = [int(c) for c in CPU_RE.findall(next(lines, ""))]
+        if cpu_ids:
+            counters_len = max(counters_len, max(cpu_ids) + 1)
+        for line in lines:
+            match = SOFTIRQ_RE.match(line)
+            if match is None:
+                continue
+            values = [0] * counters_len
+            for i, c in enumerate(match.group(2).split()):
+                if i < len(cpu_ids):
+                    values[cpu_ids[i]] = int(c)
+            counters[match.group(1)] = values
+    return counters
+
+
+def irq_affinities(path: pathlib.Path, irqs: D, cpus: D):
+    irq_dir = path / "proc/irq"
+    try:
+        with os.scandir(irq_dir) as entries:
+            names = [e.name for e in entries if e.name in irqs and e.is_dir()]
+    except FileNotFoundError:
+        return
+
+    files = []
+    for irq in names:
+        files.append(irq_dir / irq / "smp_affinity_list")
+        files.append(irq_dir / irq / "effective_affinity_list")
+    contents = read_files(files)
+
+    # most IRQs share the same few affinity lists, only decode each one once
+    cpu_sets = {}
+    for text in set(contents):
+        if text is not None:
+            cpu_sets[text] = parse_cpu_set(text)
+    masks = {text: int_mask(cpu_set) for text, cpu_set in cpu_sets.items()}
+
+    requested = []
+    effective = []
+    for i, irq in enumerate(names):
+        req, eff = contents[2 * i], contents[2 * i + 1]
+        if req is None:
+            continue
+        irqs[irq].requested_affinity = set(cpu_sets[req])
+        requested.append(masks[req])
+        if eff is None:
+            continue
+        irqs[irq].effective_affinity = set(cpu_sets[eff])
+        effective.append(masks[eff])
+
+    for key, counts in (
+        ("requested_irqs", bit_counts(requested)),
+        ("effective_irqs", bit_counts(effective)),
+    ):
+        for cpu, num in sorted(counts.items()):
+            cpus.setdefault(cpu, D(cpu=cpu))[key] = num
@@ -2,30 +2,116 @@
 # Copyright (c) 2024 Robin Jarry
 
 import pathlib
+import typing
 import xml.etree.ElementTree as ET
 
-from . import D
+from . import D, process_map
 from ..bits import parse_cpu_set
 
 
-def parse_report(path: pathlib.Path, data: D):
+# runtime definitions come last and take precedence over persistent ones
+DOMAIN_GLOBS = (
+    "etc/libvirt/qemu/*.xml",
+    # containerized libvirt (tripleo, kolla with docker or podman)
+    "var/lib/config-data/puppet-generated/nova_libvirt/etc/libvirt/qemu/*.xml",
+    "var/lib/docker/volumes/nova_libvirt_qemu/_data/*.xml",
+    "var/lib/containers/storage/volumes/nova_libvirt_qemu/_data/*.xml",
+    "var/run/libvirt/qemu/*.xml",
+    "run/libvirt/qemu/*.xml",
+)
+# below this number of domains, a process pool is slower than parsing them in
+# the current process
+PARALLEL_DOMAINS = 128
+# unused elements, cleared by prune_parse
+DROP_TAGS = {
+    "blockjobs",
+    "channel",
+    "clock",
+    "console",
+    "controller",
+    "disk",
+    "features",
+    "graphics",
+    "input",
+    "memballoon",
+    "metadata",
+    "os",
+    "qemuCaps",
+    "rng",
+    "seclabel",
+    "serial",
+    "sound",
+    "sysinfo",
+    "video",
+    "watchdog",
+}
+
+
+def parse_report(path: pathlib.Path, data: D, **opts):
     data.vms = vms = D()
-    for f in path.glob("etc/libvirt/qemu/*.xml"):
-        xml = ET.parse(f).getroot()
-        name = xml.find("./name").text
-        vms[name] = vm = D(name=name)
-        vm_cpu(vm, xml)
-        vm_memory(vm, xml)
-        vm_interfaces(vm, xml)
+    files = D()
+    for pattern in DOMAIN_GLOBS:
+        for f in path.glob(pattern):
+            files[f.name] = f
+    if len(files) < PARALLEL_DOMAINS:
+        # ET.parse is about twice as fast as iterparse
+        domains = [parse_domain(ET.parse(f).getroot()) for f in files.values()]
+    else:
+        domains = process_map(parse_domain_file, files.values())
+    for vm in domains:
+        if vm is not None:
+            vms[vm.name] = vm
+    if any(vm.get("running") for vm in vms.values()):
+        # runtime state was collected, domains without it are not running
+        for vm in vms.values():
+            vm.setdefault("running", False)
+
+
+def parse_domain_file(f: pathlib.Path) -> typing.Optional[D]:
+    return parse_domain(prune_parse(f))
+
+
+def parse_domain(root: ET.Element) -> typing.Optional[D]:
+    if root.tag == "domstatus":
+        xml = root.find("./domain")
+        if xml is None:
+            return None
+    else:
+        xml = root
+    name = xml.find("./name")
+    if name is None:
+        return None
+    vm = D(name=name.text)
+    if root.tag == "domstatus":
+        vm.running = True
+        vm.state = root.get("state", "?")
+    vm_cpu(vm, xml)
+    vm_memory(vm, xml)
+    vm_placement(vm, root)
+    vm_interfaces(vm, xml)
+    return vm
+
+
+def prune_parse(f: pathlib.Path) -> ET.Element:
+    """
+    Parse a domain XML and clear unused elements as soon as they are complete
+    to keep the memory usage of worker processes low.
+    """
+    root = None
+    for _, elem in ET.iterparse(f, events=("end",)):
+        if elem.tag in DROP_TAGS:
+            elem.clear()
+        root = elem
+    return root
 
 
 def vm_cpu(vm, xml):
     cpu = xml.find("./cpu")
-    if cpu:
+    if cpu is not None:
         vm.cpu_mode = cpu.get("mode")
 
     topo = xml.find("./cpu/topology")
-    if topo:
+    if topo is not None:
         vm.topology = t = D()
         for attr in "sockets", "dies", "cores", "threads":
             t[attr] = int(topo.get(attr, "1"))
@@ -55,12 +141,33 @@ def vm_cpu(vm, xml):
         cpuset = parse_cpu_set(vcpupin.get("cpuset"))
         vm.vcpu_pinning[vcpu] = cpuset
 
+    emulatorpin = xml.find("./cputune/emulatorpin")
+    if emulatorpin is not None:
+        vm.emulator_pinning = parse_cpu_set(emulatorpin.get("cpuset", ""))
+
+    iothreads = xml.find("./iothreads")
+    if iothreads is not None:
+        vm.iothreads = int(iothreads.text)
+    for iothreadpin in xml.findall("./cputune/iothreadpin"):
+        iothread = int(iothreadpin.get("iothread"))
+        cpuset = parse_cpu_set(iothreadpin.get("cpuset"))
+        vm.setdefault("iothread_pinning", D())[iothread] = cpuset
+
 
 def vm_memory(vm, xml):
     memory = xml.find("./memory")
-    if memory:
+    if memory is not None:
         vm.memory = int(memory.text) * multiplier(memory.get("unit"))
 
+    # default host nodes for guest cells that have no explicit memnode
+    nodeset = set()
+    mem = xml.find("./numatune/memory")
+    if mem is not None and mem.get("nodeset"):
+        nodeset = parse_cpu_set(mem.get("nodeset"))
+    for numa in vm.get("numa", D()).values():
+        if not numa.get("host_numa"):
+            numa.host_numa = set(nodeset)
+
     for node in xml.findall("./numatune/memnode"):
         numa_id = int(node.get("cellid", "0"))
         nodeset = parse_cpu_set(node.get("nodeset"))
@@ -74,6 +181,21 @@ def vm_memory(vm, xml):
                 numa.hugepage_size = size
 
 
+def vm_placement(vm, root):
+    # actual placement chosen by numad for placement='auto' domains
+    numad = root.find("./numad")
+    if numad is None:
+        return
+    vm.numa_placement = D()
+    for attr in "nodeset", "cpuset":
+        if numad.get(attr):
+            vm.numa_placement[attr] = parse_cpu_set(numad.get(attr))
+    nodeset = vm.numa_placement.get("nodeset", set())
+    for numa in vm.get("numa", D()).values():
+        if not numa.get("host_numa"):
+            numa.host_numa = set(nodeset)
+
+
 def vm_interfaces(vm, xml):
     for iface in xml.findall("./devices/interface"):
         iftype = iface.get("type")
@@ -129,11 +251,14 @@ def xpath(node: ET.Element, path: str) -> ET.Element:
 
 
 def multiplier(unit):
+    if unit is None:
+        # libvirt default unit for memory sizes
+        return 1024
     if isinstance(unit, str):
-        if unit.startswith("Ki"):
+        if unit.startswith("Ki") or unit in ("k", "K"):
             return 1024
-        if unit.startswith("Mi"):
-            return 1024 * 1024
-        if unit.startswith("Gi"):
+        if unit.startswith("Mi") or unit in ("m", "M"):
             return 1024 * 1024
+        if unit.startswith("Gi") or unit in ("g", "G"):
+            return 1024 * 1024 * 1024
     return 1
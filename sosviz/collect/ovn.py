@@ -0,0 +1,150 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import pathlib
+import re
+import typing
+
+from . import D
+from .ovs import cast_value, ovs_records, strip_quotes, tokenize_show
+
+
+LOCAL_DATAPATH_RE = re.compile(r"^Datapath:\s+([^,\s]+),\s+type:\s+(\w+)")
+
+
+def parse_report(path: pathlib.Path, data: D, **opts):
+    files = D()
+    for f in path.glob("sos_commands/ovn_*/ovn-*"):
+        files[f.name] = f
+    if not files:
+        return
+
+    data.ovn = ovn = D(
+        chassis=D(),
+        switches=0,
+        switch_ports=0,
+        routers=0,
+        router_ports=0,
+    )
+
+    def find(prefix: str, suffix: str) -> typing.Optional[pathlib.Path]:
+        for name, f in files.items():
+            if name.startswith(prefix) and name.endswith(suffix):
+                return f
+        return None
+
+    f = find("ovn-sbctl", "_show")
+    if f is not None:
+        with f.open() as lines:
+            ovn_sb_show(ovn, lines)
+
+    f = find("ovn-nbctl", "_show")
+    if f is not None:
+        with f.open() as lines:
+            ovn_nb_show(ovn, lines)
+
+    chassis = find("ovn-sbctl", "_list_Chassis")
+    datapaths = find("ovn-sbctl", "_list_Datapath_Binding")
+    bindings = find("ovn-sbctl", "_list_Port_Binding")
+    if chassis is not None and datapaths is not None and bindings is not None:
+        ovn_chassis_datapaths(ovn, chassis, datapaths, bindings)
+
+    f = find("ovn-appctl", "dump-local-datapaths")
+    if f is not None:
+        ovn.local_datapaths = D()
+        with f.open() as lines:
+            for line in lines:
+                match = LOCAL_DATAPATH_RE.match(line)
+                if match:
+                    ovn.local_datapaths[match.group(1)] = match.group(2)
+
+
+def ovn_sb_show(ovn: D, lines: typing.Iterable[str]):
+    """
+    Parse "ovn-sbctl show" output: chassis with their encapsulations and port
+    bindings.
+    """
+    chassis = encap = None
+    for indent, key, value in tokenize_show(lines):
+        if indent == 0:
+            chassis = encap = None
+            if key == "Chassis":
+                name = strip_quotes(value)
+                chassis = ovn.chassis.setdefault(
+                    name,
+                    D(name=name, hostname=name, encaps=[], port_bindings=set()),
+                )
+        elif chassis is None:
+            continue
+        elif indent <= 4:
+            encap = None
+            if key == "Encap":
+                encap = D(type=value)
+                chassis.encaps.append(encap)
+            elif key == "Port_Binding":
+                chassis.port_bindings.add(strip_quotes(value))
+            elif key == "hostname:":
+                chassis.hostname = strip_quotes(value)
+        elif encap is not None and key.endswith(":"):
+            # pylint: disable-next=unsupported-assignment-operation
+            encap[key[:-1]] = cast_value(value)
+
+
+def ovn_nb_show(ovn: D, lines: typing.Iterable[str]):
+    """
+    Count logical switches, routers and their ports from "ovn-nbctl show".
+    """
+    kind = None
+    for indent, key, _ in tokenize_show(lines):
+        if indent == 0:
+            kind = None
+            if key == "switch":
+                kind = "switch"
+                ovn.switches += 1
+            elif key == "router":
+                kind = "router"
+                ovn.routers += 1
+        elif indent == 4 and key == "port" and kind is not None:
+            ovn[f"{kind}_ports"] += 1
+
+
+def ovn_chassis_datapaths(
+    ovn: D,
+    chassis: pathlib.Path,
+    datapaths: pathlib.Path,
+    bindings: pathlib.Path,
+):
+    """
+    Resolve the datapaths bound on every chassis from the Chassis,
+    Datapath_Binding and Port_Binding tables. Only the uuid maps are kept in
+    memory, port bindings are streamed.
+    """
+    names = {}
+    with chassis.open() as lines:
+        for record in ovs_records(lines):
+            name = strip_quotes(record.get("name", ""))
+            if name in ovn.chassis:
+                names[record.get("_uuid")] = ovn.chassis[name]
+
+    kinds = {}
+    with datapaths.open() as lines:
+        for record in ovs_records(lines):
+            ids = cast_value(record.get("external_ids", "{}"))
+            if "logical_router" in ids:
+                kind = "router"
+            else:
+                kind = "switch"
+            kinds[record.get("_uuid")] = (ids.get("name", record.get("_uuid")), kind)
+
+    with bindings.open() as lines:
+        for record in ovs_records(lines):
+            c = names.get(record.get("chassis"))
+            dp = kinds.get(record.get("datapath"))
+            if c is None or dp is None:
+                continue
+            c.setdefault("datapaths", D())[dp[0]] = dp[1]
+
+    for c in ovn.chassis.values():
+        dps = c.get("datapaths", D()).values()
+        c.switches = sum(1 for k in dps if k == "switch")
+        c.routers = sum(1 for k in dps if k == "router")
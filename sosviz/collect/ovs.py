@@ -1,32 +1,16 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright (c) 2024 Robin Jarry
 
+import collections
+import heapq
 import pathlib
 import re
+import typing
 
-from . import D
+from . import D, LazyD
 from ..bits import parse_cpu_set
 
 
-PORT_RE = re.compile(
-    r"""
-    ^\s{8}Port\s(?P<name>.+)\n
-        (?:^\s+tag:\s(?P<tag>\d+)\n)?
-        (?P<ifaces>(?:^\s+Interface\s.+\n
-            (?:^\s+type:\s.*\n)?
-            (?:^\s+options:\s.*\n)?
-        )+)
-    """,
-    re.VERBOSE | re.MULTILINE,
-)
-IFACE_RE = re.compile(
-    r"""
-    ^\s+Interface\s+(?P<name>.+)\n
-        (?:^\s+type:\s+(?P<type>.+)\n)?
-        (?:^\s+options:\s+(?P<options>.+)\n)?
-    """,
-    re.VERBOSE | re.MULTILINE,
-)
 RXQ_RE = re.compile(
     r"""
     \s+port:\s+(\S+)
@@ -39,7 +23,7 @@ RXQ_RE = re.compile(
 )
 
 
-def parse_report(path: pathlib.Path, data: dict):
+def parse_report(path: pathlib.Path, data: dict, **opts):
     data.ovs = ovs = D()
     ovs.config = conf = D()
     for f in path.glob("sos_commands/openvswitch/ovs-vsctl*_list_Open_vSwitch"):
@@ -54,62 +38,255 @@ def parse_report(path: pathlib.Path, data: dict):
     ovs_pmds(ovs, path)
 
 
+def post_collect(data: D):
+    """
+    Resolve the remote chassis of OVN tunnel ports from the encapsulation IPs.
+    """
+    if "ovn" not in data:
+        return
+    ovs = data.ovs
+    remotes = {}
+    for chassis in data.ovn.chassis.values():
+        for encap in chassis.encaps:
+            if "ip" in encap:
+                remotes[encap.ip] = chassis.hostname
+    for port in ovs.ports.values():
+        if port.type not in ("geneve", "vxlan", "stt"):
+            continue
+        remote = remotes.get(port.get("options", D()).get("remote_ip"))
+        if remote is not None:
+            port.remote_chassis = remote
+
+
 def ovs_ports(ovs, path):
     ovs.bridges = bridges = D()
-    ovs.ports = ports = D()
+    ovs.ports = D()
+    ovs.managers = []
     for f in path.glob("sos_commands/openvswitch/ovs-vsctl*_show"):
-        for block in re.split(r"^    Bridge ", f.read_text(), flags=re.MULTILINE):
-            br_name, block = block.split("\n", 1)
-            br_name = strip_quotes(br_name)
-            datapath = "system"
-            match = re.search(r"datapath_type: (\S+)", block)
-            if match:
-                datapath = match.group(1)
-            for match in PORT_RE.finditer(block):
-                ifaces = D()
-                for m in IFACE_RE.finditer(match.group("ifaces")):
-                    name = strip_quotes(m.group("name"))
-                    ifaces[name] = D(name=name, type=m.group("type") or "")
-                    if m.group("options"):
-                        ifaces[name].options = cast_value(m.group("options"))
-                if not ifaces:
-                    continue
-                port_name = strip_quotes(match.group("name"))
-                port = D(name=port_name, bridge=br_name, stats=D())
-                if len(ifaces) == 1 and port_name in ifaces:
-                    port.update(ifaces[port_name])
-                else:
-                    port.type = "bond"
-                    port.members = ifaces
-                if match.group("tag"):
-                    port.tag = int(match.group("tag"))
-
-                ports[port_name] = port
-                bridges.setdefault(
-                    br_name, D(name=br_name, ports=0, of_rules=0)
-                ).ports += 1
-                bridges[br_name].datapath = datapath
+        with f.open() as lines:
+            ovs_show(ovs, lines)
+
+    ovs_interfaces(ovs, path)
+
+    for name, br in bridges.items():
+        files = path.glob(f"sos_commands/openvswitch/ovs-ofctl*_dump-flows_{name}")
+        # All dump-flows variants (OpenFlow versions) contain the same rules
+        # but some may have failed with a short error message. Only parse the
+        # largest one, the first in name order if several have the same size.
+        files = sorted(files, key=lambda f: (-f.stat().st_size, f.name))
+        if files:
+            with files[0].open() as lines:
+                br.flows = ovs_flows(lines)
+            br.of_rules = br.flows.rules
+
+
+FLOW_STATS_RE = re.compile(
+    r"""
+    \btable=(?P<table>\d+),\s
+    n_packets=(?P<n_packets>\d+),\s
+    n_bytes=(?P<n_bytes>\d+),
+    (?:\s*idle_timeout=(?P<idle_timeout>\d+),)?
+    (?:\s*hard_timeout=(?P<hard_timeout>\d+),)?
+    (?:\s*idle_age=\d+,)?
+    (?:\s*hard_age=\d+,)?
+    """,
+    re.VERBOSE,
+)
+TOP_FLOWS = 5
+
+
+def ovs_flows(lines: typing.Iterable[str]) -> D:
+    """
+    Summarize "ovs-ofctl dump-flows" output without keeping it in memory.
+    """
+    rules = drop_rules = 0
+    tables = collections.Counter()
+    idle_timeouts = collections.Counter()
+    hard_timeouts = collections.Counter()
+    top_packets = []
+    top_bytes = []
+    search = FLOW_STATS_RE.search
+    for line in lines:
+        match = search(line)
+        if not match:
+            continue
+        rules += 1
+        table, n_packets, n_bytes, idle, hard = match.groups()
+        tables[table] += 1
+        idle_timeouts[idle] += 1
+        hard_timeouts[hard] += 1
+        if line.endswith(" actions=drop\n") or line.endswith(" actions=drop"):
+            drop_rules += 1
+        n_packets = int(n_packets)
+        n_bytes = int(n_bytes)
+        for top, key in (top_packets, n_packets), (top_bytes, n_bytes):
+            if len(top) < TOP_FLOWS:
+                heapq.heappush(top, (key, rules, line))
+            elif key > top[0][0]:
+                heapq.heapreplace(top, (key, rules, line))
+
+    flows = D(rules=rules, drop_rules=drop_rules, tables=D())
+    for table, num in sorted((int(t), n) for t, n in tables.items()):
+        flows.tables[table] = num
+    for attr, counter in ("idle_timeouts", idle_timeouts), (
+        "hard_timeouts",
+        hard_timeouts,
+    ):
+        flows[attr] = timeouts = D()
+        for timeout, num in counter.items():
+            timeout = int(timeout or 0)
+            timeouts[timeout] = timeouts.get(timeout, 0) + num
+    for attr, top in ("top_packets", top_packets), ("top_bytes", top_bytes):
+        flows[attr] = []
+        for _, _, line in sorted(top, reverse=True):
+            match = search(line)
+            rule, _, actions = line[match.end() :].strip().rpartition(" actions=")
+            flows[attr].append(
+                D(
+                    table=int(match.group("table")),
+                    rule=rule,
+                    actions=actions,
+                    n_packets=int(match.group("n_packets")),
+                    n_bytes=int(match.group("n_bytes")),
+                )
+            )
+    return flows
+
+
+# map columns that are only decoded when read, with their port attribute name
+LAZY_COLUMNS = {
+    "statistics": "stats",
+    "other_config": "other_config",
+    "status": "status",
+}
+
+
+def ovs_interfaces(ovs: D, path: pathlib.Path):
+    # interface name -> port or bond member, top level port names win
+    index = D()
+    for port in ovs.ports.values():
+        for member in port.get("members", D()).values():
+            index.setdefault(member.name, member)
+    for port in ovs.ports.values():
+        index[port.name] = port
 
     for f in path.glob("sos_commands/openvswitch/ovs-vsctl*_list_interface"):
-        for block in f.read_text().split("\n\n"):
-            d = {}
-            ovs_to_dict(block, d)
-            if d.get("name") in ovs.ports:
-                p = ovs.ports[d["name"]]
-            else:
-                for port in ovs.ports.values():
-                    if "members" in port and d["name"] in port.members:
-                        p = port.members[d["name"]]
-                        break
-                else:
+        with f.open() as lines:
+            for record in ovs_records(lines):
+                p = index.get(cast_value(record.get("name", "")))
+                if p is None:
                     continue
-            p.admin_state = d.get("admin_state", "?")
-            p.link_state = d.get("link_state", "?")
-            p.stats = D(d.get("statistics", {}))
+                p.admin_state = cast_value(record.get("admin_state", "")) or "?"
+                p.link_state = cast_value(record.get("link_state", "")) or "?"
+                for column, attr in LAZY_COLUMNS.items():
+                    raw = record.get(column, "{}")
+                    if raw != "{}" or attr == "stats":
+                        p[attr] = LazyD(raw, cast_value)
 
-    for name, br in bridges.items():
-        for f in path.glob(f"sos_commands/openvswitch/ovs-ofctl*_dump-flows_{name}"):
-            br.of_rules = len(f.read_text().splitlines()) - 1
+
+def ovs_records(lines: typing.Iterable[str]) -> typing.Iterator[dict]:
+    """
+    Split "ovs-vsctl list" output into records of raw column values.
+    """
+    record = {}
+    for line in lines:
+        key, sep, value = line.partition(":")
+        if not sep:
+            if record:
+                yield record
+            record = {}
+            continue
+        record[key.strip()] = value.strip()
+    if record:
+        yield record
+
+
+def tokenize_show(lines: typing.Iterable[str]) -> typing.Iterator[tuple]:
+    """
+    Split "ovs-vsctl show" output into (indent, keyword, value) tuples. Record
+    headers (Bridge, Port, Interface...) have no colon after the keyword.
+    """
+    for line in lines:
+        stripped = line.lstrip()
+        indent = len(line) - len(stripped)
+        key, _, value = stripped.rstrip().partition(" ")
+        if not key:
+            continue
+        yield indent, key, value.strip()
+
+
+def ovs_show(ovs: D, lines: typing.Iterable[str]):
+    bridge = port = iface = controller = None
+
+    def end_port():
+        if port is None or not port.ifaces:
+            return
+        ifaces = port.pop("ifaces")
+        if len(ifaces) == 1 and port.name in ifaces:
+            port.update(ifaces[port.name])
+        else:
+            port.type = "bond"
+            port.members = ifaces
+        ovs.ports[port.name] = port
+        bridge.ports += 1
+
+    for indent, key, value in tokenize_show(lines):
+        if indent <= 4:
+            end_port()
+            bridge = port = iface = controller = None
+            if key == "Bridge":
+                name = strip_quotes(value)
+                bridge = ovs.bridges.setdefault(
+                    name, D(name=name, ports=0, of_rules=0, datapath="system")
+                )
+            elif key == "Manager":
+                controller = D(target=strip_quotes(value))
+                ovs.managers.append(controller)
+            elif key.endswith(":"):
+                ovs[key[:-1]] = cast_value(value)
+        elif bridge is None:
+            if controller is not None and key.endswith(":"):
+                # pylint: disable-next=unsupported-assignment-operation
+                controller[key[:-1]] = cast_value(value)
+        elif indent <= 8:
+            end_port()
+            port = iface = controller = None
+            if key == "Port":
+                port = D(
+                    name=strip_quotes(value),
+                    bridge=bridge.name,
+                    stats=D(),
+                    ifaces=D(),
+                )
+            elif key == "Controller":
+                controller = D(target=strip_quotes(value))
+                bridge.setdefault("controllers", []).append(controller)
+            elif key == "datapath_type:":
+                bridge.datapath = value
+            elif key.endswith(":"):
+                bridge[key[:-1]] = cast_value(value)
+        elif controller is not None:
+            if key.endswith(":"):
+                controller[key[:-1]] = cast_value(value)
+        elif port is None:
+            continue
+        elif indent <= 12:
+            iface = None
+            if key == "Interface":
+                name = strip_quotes(value)
+                iface = port.ifaces[name] = D(name=name, type="")
+            elif key == "tag:":
+                port.tag = int(value)
+            elif key.endswith(":"):
+                port[key[:-1]] = cast_value(value)
+        elif iface is not None and key.endswith(":"):
+            if key == "type:":
+                iface.type = value
+            else:
+                # pylint: disable-next=unsupported-assignment-operation
+                iface[key[:-1]] = cast_value(value)
+
+    end_port()
 
 
 def strip_quotes(s: str) -> str:
@@ -144,6 +321,114 @@ def ovs_pmds(ovs, path):
                     )
                 )
 
+    for name, key, parse in (
+        ("pmd-stats-show", "stats", pmd_stats),
+        ("pmd-perf-show", "perf", pmd_perf),
+    ):
+        f = path / f"sos_commands/openvswitch/ovs-appctl_dpif-netdev.{name}"
+        if not f.is_file():
+            continue
+        with f.open() as lines:
+            for numa, core, counters in pmd_counters(lines):
+                pmd = pmds.setdefault(core, D(numa=numa, core=core, rxqs=[]))
+                pmd[key] = parse(counters)
+
+
+PMD_THREAD_RE = re.compile(r"^pmd thread numa_id (\d+) core_id (\d+):")
+PMD_COUNTER_RE = re.compile(r"^\s+(?:-\s+)?([A-Za-z][^:]*):\s+([\d.]+)\s*(?:\((.*)\))?")
+PMD_NOTE_RE = re.compile(r"([\d.]+)\s*(%|cycles/pkt|us/upcall)")
+
+
+def pmd_counters(
+    lines: typing.Iterable[str],
+) -> typing.Iterator[typing.Tuple[int, int, D]]:
+    """
+    Stream "ovs-appctl dpif-netdev/pmd-{stats,perf}-show" output. Yield the
+    counters of every PMD thread (the main thread is ignored). Each counter is
+    stored with its value and the numbers found in its parenthesized note,
+    indexed by unit.
+    """
+    numa = core = counters = None
+    for line in lines:
+        if not line.strip():
+            continue
+        match = PMD_THREAD_RE.match(line)
+        if match:
+            if counters is not None:
+                yield numa, core, counters
+            numa, core = (int(g) for g in match.groups())
+            counters = D()
+            continue
+        if not line[0].isspace():
+            # main thread, or measurement header of the next section
+            if counters is not None:
+                yield numa, core, counters
+            counters = None
+            continue
+        if counters is None:
+            continue
+        match = PMD_COUNTER_RE.match(line)
+        if match:
+            key, value, note = match.groups()
+            counter = D(value=float(value))
+            for num, unit in PMD_NOTE_RE.findall(note or ""):
+                counter.setdefault(unit, float(num))
+            counters[re.sub(r"\W+", "_", key.lower()).strip("_")] = counter
+    if counters is not None:
+        yield numa, core, counters
+
+
+def pmd_stats(counters: D) -> D:
+    def get(key: str) -> float:
+        return counters.get(key, D()).get("value", 0.0)
+
+    stats = D(
+        packets=int(get("packets_received")),
+        emc_hits=int(get("emc_hits")),
+        smc_hits=int(get("smc_hits")),
+        megaflow_hits=int(get("megaflow_hits")),
+        upcalls=int(get("miss_with_success_upcall")),
+        failed_upcalls=int(get("miss_with_failed_upcall")),
+        idle_cycles=int(get("idle_cycles")),
+        processing_cycles=int(get("processing_cycles")),
+    )
+    lookups = (
+        stats.emc_hits
+        + stats.smc_hits
+        + stats.megaflow_hits
+        + stats.upcalls
+        + stats.failed_upcalls
+    )
+    for hits in "emc", "smc", "megaflow":
+        stats[f"{hits}_rate"] = pct(stats[f"{hits}_hits"], lookups)
+    stats.busy = pct(
+        stats.processing_cycles, stats.idle_cycles + stats.processing_cycles
+    )
+    stats.cycles_per_packet = round(get("avg_processing_cycles_per_packet"), 2)
+    return stats
+
+
+def pmd_perf(counters: D) -> D:
+    def get(key: str, unit: str = "value") -> float:
+        return counters.get(key, D()).get(unit, 0.0)
+
+    return D(
+        iterations=int(get("iterations")),
+        busy_iterations=get("busy_iterations", "%"),
+        used_cycles=get("used_tsc_cycles", "%"),
+        packets=int(get("rx_packets")),
+        cycles_per_packet=get("rx_packets", "cycles/pkt"),
+        upcalls=int(get("upcalls")),
+        lost_upcalls=int(get("lost_upcalls")),
+        us_per_upcall=get("upcalls", "us/upcall"),
+    )
+
+
+def pct(value: float, total: float) -> float:
+    if not total:
+        return 0.0
+    return round(100 * value / total, 2)
+
 
 PROP_RE = re.compile(r"^([\w-]+)\s*:\s*(.*)$", re.MULTILINE)
 
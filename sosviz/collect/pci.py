@@ -7,7 +7,7 @@ import re
 from . import D
 
 
-def parse_report(path: pathlib.Path, data: dict):
+def parse_report(path: pathlib.Path, data: dict, **opts):
     bridges = pci_bridges(path)
     for node in path.glob("sys/devices/system/node/node*"):
         match = re.match(r"node(\d+)", node.name)
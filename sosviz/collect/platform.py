@@ -7,7 +7,7 @@ import re
 from . import D
 
 
-def parse_report(path: pathlib.Path, data: D):
+def parse_report(path: pathlib.Path, data: D, **opts):
     data.hardware = hw = D(system="Unknown Hardware", processor=[], memory=[])
     f = path / "sos_commands/hardware/dmidecode"
     if not f.is_file():
@@ -0,0 +1,140 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import array
+import math
+import pathlib
+import re
+import typing
+
+from . import D
+
+
+SAR_FILE_RE = re.compile(r"^sar(?:_-A_-f_sa)?(\d+)$")
+TIME_RE = re.compile(r"^\d\d:\d\d:\d\d$")
+# column name -> series name, for every section of interest
+SECTIONS = {
+    "cpu": {
+        "%usr": "usr",
+        "%user": "usr",
+        "%sys": "sys",
+        "%system": "sys",
+        "%soft": "soft",
+        "%idle": "idle",
+    },
+    "net": {
+        "rxpck/s": "rx_pps",
+        "txpck/s": "tx_pps",
+    },
+    "net_errors": {
+        "rxdrop/s": "rx_drops",
+        "txdrop/s": "tx_drops",
+    },
+    "memory": {
+        "%memused": "used",
+        "%commit": "commit",
+    },
+}
+
+
+def parse_report(path: pathlib.Path, data: D, **opts):
+    files = D()
+    # sos_commands/sar/sar_-A_-f_saDD is generated when var/log/sa/sarDD is
+    # missing, do not parse the same day twice
+    for pattern in "sos_commands/sar/sar*", "var/log/sa/sar[0-9]*":
+        for f in path.glob(pattern):
+            match = SAR_FILE_RE.match(f.name)
+            if match:
+                files[match.group(1)] = f
+    if not files:
+        return
+
+    series = D(cpu=D(), net=D(), net_errors=D(), memory=D())
+    for day in sorted(files):
+        with files[day].open(errors="replace") as lines:
+            sar_series(lines, series)
+
+    data.sar = sar = D(days=sorted(files), cpus=D(), interfaces=D(), memory=D())
+    for cpu, s in series.cpu.items():
+        if "idle" in s:
+            s.busy = array.array("d", (100 - v for v in s.idle))
+        sar.cpus[cpu] = D((k, percentiles(v)) for k, v in s.items())
+    for section in series.net, series.net_errors:
+        for iface, s in section.items():
+            i = sar.interfaces.setdefault(iface, D())
+            for k, v in s.items():
+                i[k] = percentiles(v)
+    for k, v in series.memory.get("", D()).items():
+        sar.memory[k] = percentiles(v)
+
+
+def sar_series(lines: typing.Iterable[str], series: D):
+    """
+    Stream "sar -A" text output and append the samples of interest to compact
+    float arrays, indexed by section, device and series name.
+    """
+    section = None
+    columns = None
+    for line in lines:
+        tokens = line.split()
+        if len(tokens) < 2 or not TIME_RE.match(tokens[0]):
+            # blank line, "Average:" summaries, file header
+            section = None
+            continue
+        if tokens[1] in ("AM", "PM"):
+            tokens = tokens[2:]
+        else:
+            tokens = tokens[1:]
+        if not tokens or tokens[0] == "LINUX":
+            # LINUX RESTART markers
+            continue
+
+        if not tokens[-1][0].isdigit():
+            # section header
+            section, columns = sar_section(tokens)
+            continue
+        if section is None:
+            continue
+
+        if section == "memory":
+            dev = ""
+        else:
+            dev = tokens[0]
+        dev_series = series[section].get(dev)
+        if dev_series is None:
+            dev_series = series[section][dev] = D(
+                (name, array.array("d")) for _, name in columns
+            )
+        try:
+            for i, name in columns:
+                dev_series[name].append(float(tokens[i].replace(",", ".")))
+        except (IndexError, ValueError):
+            continue
+
+
+def sar_section(
+    header: typing.List[str],
+) -> typing.Tuple[typing.Optional[str], list]:
+    for section, names in SECTIONS.items():
+        columns = [(i, names[h]) for i, h in enumerate(header) if h in names]
+        if columns:
+            return section, columns
+    return None, []
+
+
+def percentiles(values: typing.Sequence[float]) -> D:
+    if not values:
+        return D(samples=0)
+    values = sorted(values)
+    n = len(values)
+
+    def rank(p: float) -> float:
+        return round(values[max(math.ceil(p * n) - 1, 0)], 2)
+
+    return D(
+        samples=n,
+        p50=rank(0.50),
+        p95=rank(0.95),
+        max=round(values[-1], 2),
+        mean=round(sum(values) / n, 2),
+    )
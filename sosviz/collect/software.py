@@ -13,7 +13,7 @@ RPMS_OF_INTEREST_RE = re.compile(
 PODMAN_PS_RE = re.compile(r"^[a-f0-9]+\s+(\S+)\s", re.MULTILINE)
 
 
-def parse_report(path: pathlib.Path, data: D):
+def parse_report(path: pathlib.Path, data: D, **opts):
     data.software = sw = D()
     data.hostname = (path / "hostname").read_text().strip()
 
@@ -1,14 +1,24 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright (c) 2024 Robin Jarry
 
+import os
 import pathlib
 import re
+import typing
 
-from . import D
-from ..bits import parse_cpu_set
+from . import D, read_files
+from ..bits import int_mask, mask_bits, parse_cpu_set
 
 
-def parse_report(path: pathlib.Path, data: D):
+def parse_report(path: pathlib.Path, data: D, **opts):
+    data.cpu_topology = topo = cpu_topology(path)
+
+    # derive per node views from the topology table in a single pass
+    node_cpus = D()
+    for cpu, node in enumerate(topo.node):
+        if node is not None:
+            node_cpus.setdefault(node, []).append(cpu)
+
     nodes = list(path.glob("sys/devices/system/node/node[0-9]*"))
     for node in nodes:
         match = re.match(r"^node(\d+)$", node.name)
@@ -39,23 +49,20 @@ def parse_report(path: pathlib.Path, data: D):
                 numa.setdefault("hugepages", D())[size] = int(huge.read_text())
 
         offline_cpus = set()
-        for cpu in path.glob("sys/devices/system/cpu/cpu[0-9]*"):
-            if not (cpu / f"node{numa_id}").is_dir():
-                continue
-            cpu_id = int(re.match(r"cpu(\d+)", cpu.name).group(1))
-            online = cpu / "online"
-            if online.is_file() and online.read_text().strip() == "0":
+        l2 = set()
+        l3 = set()
+        for cpu_id in node_cpus.get(numa_id, []):
+            if not topo.online[cpu_id]:
                 offline_cpus.add(cpu_id)
                 continue
-            topo = cpu / "topology"
-            try:
-                threads = parse_cpu_set((topo / "thread_siblings_list").read_text())
-            except FileNotFoundError:
-                try:
-                    threads = parse_cpu_set((topo / "core_cpus_list").read_text())
-                except FileNotFoundError:
-                    # hyperthreading disabled
-                    continue
+            if topo.l2[cpu_id]:
+                l2.add(topo.l2[cpu_id])
+            if topo.l3[cpu_id]:
+                l3.add(topo.l3[cpu_id])
+            if not topo.siblings[cpu_id]:
+                # hyperthreading disabled
+                continue
+            threads = mask_bits(topo.siblings[cpu_id])
             for t in threads:
                 siblings[t] = threads - {t}
         numa.cpus = cpus
@@ -63,6 +70,10 @@ def parse_report(path: pathlib.Path, data: D):
         numa.isolated_cpus = set()
         numa.offline_cpus = offline_cpus
         numa.thread_siblings = siblings
+        numa.cache_groups = D(
+            l2=[mask_bits(m) for m in sorted(l2)],
+            l3=[mask_bits(m) for m in sorted(l3)],
+        )
 
     cmdline = (path / "proc/cmdline").read_text()
     match = re.search(r"\bisolcpus=([\d,-]+)\b", cmdline)
@@ -71,3 +82,90 @@ def parse_report(path: pathlib.Path, data: D):
         for numa in data.numa.values():
             numa.housekeeping_cpus = numa.cpus - isolated_cpus
             numa.isolated_cpus = numa.cpus & isolated_cpus
+
+
+CPU_DIR_RE = re.compile(r"^cpu(\d+)$")
+NODE_LINK_RE = re.compile(r"^node(\d+)$")
+CPU_FILES = (
+    "online",
+    "topology/thread_siblings_list",
+    "topology/core_cpus_list",
+    "topology/core_id",
+    "topology/physical_package_id",
+    "cache/index2/level",
+    "cache/index2/shared_cpu_list",
+    "cache/index3/level",
+    "cache/index3/shared_cpu_list",
+)
+
+
+def cpu_topology(path: pathlib.Path) -> D:
+    """
+    Scan all sys/devices/system/cpu/cpuN directories once and return a table
+    indexed by CPU id. Sibling and cache sharing groups are stored as integer
+    bit masks.
+    """
+    cpu_dirs = D()
+    nodes = D()
+    try:
+        with os.scandir(path / "sys/devices/system/cpu") as entries:
+            for e in entries:
+                match = CPU_DIR_RE.match(e.name)
+                if not match or not e.is_dir():
+                    continue
+                cpu_id = int(match.group(1))
+                cpu_dirs[cpu_id] = pathlib.Path(e.path)
+                with os.scandir(e.path) as links:
+                    for link in links:
+                        match = NODE_LINK_RE.match(link.name)
+                        if match:
+                            nodes[cpu_id] = int(match.group(1))
+    except FileNotFoundError:
+        pass
+
+    size = max(cpu_dirs.keys(), default=-1) + 1
+    topo = D(
+        node=[None] * size,
+        core=[None] * size,
+        package=[None] * size,
+        online=[False] * size,
+        siblings=[0] * size,
+        l2=[0] * size,
+        l3=[0] * size,
+    )
+    ids = sorted(cpu_dirs.keys())
+    contents = read_files([cpu_dirs[c] / f for c in ids for f in CPU_FILES])
+
+    masks = {}
+
+    def mask(text: typing.Optional[str]) -> int:
+        if text is None:
+            return 0
+        if text not in masks:
+            masks[text] = int_mask(parse_cpu_set(text))
+        return masks[text]
+
+    for i, cpu_id in enumerate(ids):
+        (
+            online,
+            thread_siblings,
+            core_cpus,
+            core_id,
+            package_id,
+            l2_level,
+            l2_cpus,
+            l3_level,
+            l3_cpus,
+        ) = contents[i * len(CPU_FILES) : (i + 1) * len(CPU_FILES)]
+        topo.node[cpu_id] = nodes.get(cpu_id)
+        topo.online[cpu_id] = online is None or online.strip() != "0"
+        if core_id is not None:
+            topo.core[cpu_id] = int(core_id)
+        if package_id is not None:
+            topo.package[cpu_id] = int(package_id)
+        topo.siblings[cpu_id] = mask(thread_siblings or core_cpus)
+        for level, cpus in (l2_level, l2_cpus), (l3_level, l3_cpus):
+            if level is not None and level.strip() in ("2", "3"):
+                topo[f"l{level.strip()}"][cpu_id] = mask(cpus)
+
+    return topo
@@ -11,7 +11,7 @@ from ..bits import parse_cpu_set
 VARIABLE_RE = re.compile(r"^(\w+)\s*=\s*(.+)$", re.MULTILINE)
 
 
-def parse_report(path: pathlib.Path, data: D):
+def parse_report(path: pathlib.Path, data: D, **opts):
     cmdline = (path / "proc/cmdline").read_text()
     tuning = D()
     for prop in "isolcpus", "nohz_full", "rcu_nocbs":
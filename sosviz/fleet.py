@@ -0,0 +1,297 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+"""
+Maintain a SQLite database of parsed sos reports and query it.
+"""
+
+import argparse
+import contextlib
+import hashlib
+from importlib import metadata
+import os
+import pathlib
+import sqlite3
+import sys
+import time
+import typing
+
+from . import collect
+from .output.tables import NETDEV_STATS, OVS_STATS, TABLES, table_rows
+
+
+def main(argv: typing.Optional[typing.List[str]] = None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "-d",
+        "--debug",
+        action="store_true",
+        help="""
+        Show debug info.
+        """,
+    )
+    parser = argparse.ArgumentParser(description=__doc__, prog="sosviz-fleet")
+    sub = parser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+    p = sub.add_parser(
+        "index",
+        parents=[common],
+        description="""
+        Parse sos reports and store them in DB. Reports which did not change
+        since they were last indexed are not parsed again.
+        """,
+        help="Index sos reports.",
+    )
+    p.add_argument("db", metavar="DB", type=pathlib.Path, help="Database file.")
+    p.add_argument(
+        "paths",
+        metavar="PATH",
+        type=pathlib.Path,
+        nargs="+",
+        help="Path to an uncompressed sos report folder.",
+    )
+    p = sub.add_parser(
+        "query",
+        parents=[common],
+        description=f"""
+        Run a query on DB and print the results as tab separated values. QUERY
+        is either a SQL statement or one of the predefined queries
+        ({', '.join(QUERIES)}), with an optional argument.
+        """,
+        help="Query indexed reports.",
+    )
+    p.add_argument("db", metavar="DB", type=pathlib.Path, help="Database file.")
+    p.add_argument("query", metavar="QUERY", help="SQL statement or query name.")
+    p.add_argument("arg", metavar="ARG", nargs="?", help="Predefined query argument.")
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "index":
+            errors = 0
+            with contextlib.closing(connect(args.db)) as db:
+                for path in args.paths:
+                    try:
+                        status = index_report(db, path)
+                    except Exception as e:
+                        if args.debug:
+                            raise
+                        status = f"error: {e}"
+                        errors += 1
+                    print(f"{path}: {status}")
+            if errors:
+                sys.exit(1)
+        else:
+            if not args.db.is_file():
+                raise ValueError(f"'{args.db}': No such file")
+            with contextlib.closing(connect(args.db)) as db:
+                write_results(db.execute(*query_sql(args.query, args.arg)))
+    except BrokenPipeError:
+        pass
+    except Exception as e:
+        if args.debug:
+            raise
+        print(f"error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+SCHEMA_VERSION = 1
+SQL_TYPES = {str: "TEXT", int: "INTEGER", bool: "INTEGER"}
+INDEXES = {
+    "interfaces": ("name",),
+    "ethtool_stats": ("counter",),
+    "ovs_ports": ("name",),
+    "pmd_rxqs": ("port",),
+    "irq_counters": ("irq",),
+    "vm_vcpus": ("vm",),
+    "pci_nics": ("kernel_driver",),
+}
+
+
+def connect(path: pathlib.Path) -> sqlite3.Connection:
+    """
+    Open the database and create the tables if it is empty. Databases with
+    another schema version are refused, they are never modified.
+    """
+    db = sqlite3.connect(path)
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version == SCHEMA_VERSION:
+        return db
+    if version != 0 or db.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0]:
+        db.close()
+        raise ValueError(
+            f"'{path}': unsupported schema version {version} "
+            f"(expected {SCHEMA_VERSION}), use a new database"
+        )
+    with db:
+        db.execute("""
+            CREATE TABLE reports (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                host TEXT,
+                fingerprint TEXT NOT NULL,
+                indexed REAL NOT NULL
+            )
+            """)
+        for table, columns in TABLES.items():
+            # the host name is stored once in the reports table
+            cols = ", ".join(f"{name} {SQL_TYPES[t]}" for name, t in columns[1:])
+            db.execute(f"CREATE TABLE {table} (report INTEGER NOT NULL, {cols})")
+            db.execute(f"CREATE INDEX {table}_report ON {table} (report)")
+            for col in INDEXES.get(table, ()):
+                db.execute(f"CREATE INDEX {table}_{col} ON {table} ({col})")
+        db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return db
+
+
+def sosviz_version() -> str:
+    try:
+        return metadata.version("sosviz")
+    except metadata.PackageNotFoundError:
+        # running from a source checkout
+        return "dev"
+
+
+def fingerprint(path: pathlib.Path) -> str:
+    """
+    Hash the names, sizes and modification times of all files of a report and
+    the sosviz version. Files are not read.
+    """
+    h = hashlib.sha256(sosviz_version().encode())
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            f = os.path.join(root, name)
+            try:
+                st = os.lstat(f)
+            except OSError:
+                continue
+            rel = os.path.relpath(f, path)
+            h.update(f"{rel}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def index_report(db: sqlite3.Connection, path: pathlib.Path) -> str:
+    if not path.is_dir():
+        raise ValueError(f"'{path}': No such directory")
+    path = path.resolve()
+    fp = fingerprint(path)
+    row = db.execute(
+        "SELECT id, fingerprint FROM reports WHERE path = ?", (str(path),)
+    ).fetchone()
+    if row is not None and row[1] == fp:
+        return "unchanged"
+
+    report = collect.parse_report(path)
+    with db:
+        if row is None:
+            report_id = db.execute(
+                "INSERT INTO reports (path, host, fingerprint, indexed) "
+                "VALUES (?, ?, ?, ?)",
+                (str(path), report.get("hostname"), fp, time.time()),
+            ).lastrowid
+        else:
+            report_id = row[0]
+            db.execute(
+                "UPDATE reports SET host = ?, fingerprint = ?, indexed = ? "
+                "WHERE id = ?",
+                (report.get("hostname"), fp, time.time(), report_id),
+            )
+            for table in TABLES:
+                db.execute(f"DELETE FROM {table} WHERE report = ?", (report_id,))
+
+        rows = {table: [] for table in TABLES}
+        for table, values in table_rows(report):
+            rows[table].append((report_id, *values[1:]))
+        for table, values in rows.items():
+            marks = ", ".join("?" * len(TABLES[table]))
+            db.executemany(f"INSERT INTO {table} VALUES ({marks})", values)
+
+    return "indexed" if row is None else "updated"
+
+
+def query_pmd_usage(arg: typing.Optional[str]) -> tuple:
+    return (
+        """
+        SELECT r.host, q.numa, q.core, SUM(q.usage) AS usage
+        FROM pmd_rxqs q JOIN reports r ON r.id = q.report
+        WHERE q.enabled
+        GROUP BY q.report, q.core
+        HAVING usage >= ?
+        ORDER BY usage DESC, r.host, q.core
+        """,
+        (int(arg or 90),),
+    )
+
+
+def query_numa_mismatch(arg: typing.Optional[str]) -> tuple:
+    return (
+        """
+        SELECT DISTINCT r.host, n.pci_id, n.kernel_driver, p.name AS port,
+            n.numa AS nic_numa, q.numa AS pmd_numa, q.core
+        FROM pci_nics n
+        JOIN ovs_ports p ON p.report = n.report AND p.dpdk_devargs = n.pci_id
+        JOIN pmd_rxqs q ON q.report = n.report AND q.port = p.name
+        JOIN reports r ON r.id = n.report
+        WHERE q.numa != n.numa AND (:driver IS NULL OR n.kernel_driver = :driver)
+        ORDER BY r.host, n.pci_id, q.core
+        """,
+        {"driver": arg},
+    )
+
+
+def query_counter(arg: typing.Optional[str]) -> tuple:
+    if not arg:
+        raise ValueError("counter: missing counter name")
+    parts = ["""
+        SELECT r.host, 'ethtool' AS source, e.interface AS name, e.value
+        FROM ethtool_stats e JOIN reports r ON r.id = e.report
+        WHERE e.counter = :counter
+        """]
+    # fixed columns, the name is checked before being used in the statement
+    if arg in OVS_STATS:
+        parts.append(f"""
+            SELECT r.host, 'ovs', p.name, p.{arg}
+            FROM ovs_ports p JOIN reports r ON r.id = p.report
+            WHERE p.{arg} != 0
+            """)
+    if arg in NETDEV_STATS:
+        parts.append(f"""
+            SELECT r.host, 'netdev', i.netns || '/' || i.name, i.{arg}
+            FROM interfaces i JOIN reports r ON r.id = i.report
+            WHERE i.{arg} != 0
+            """)
+    return " UNION ALL ".join(parts) + " ORDER BY 1, 2, 3", {"counter": arg}
+
+
+def query_reports(arg: typing.Optional[str]) -> tuple:
+    return (
+        """
+        SELECT host, path, datetime(indexed, 'unixepoch') AS indexed
+        FROM reports ORDER BY host, path
+        """,
+        (),
+    )
+
+
+QUERIES = {
+    "pmd-usage": query_pmd_usage,
+    "numa-mismatch": query_numa_mismatch,
+    "counter": query_counter,
+    "reports": query_reports,
+}
+
+
+def query_sql(query: str, arg: typing.Optional[str]) -> tuple:
+    if query in QUERIES:
+        return QUERIES[query](arg)
+    if arg is not None:
+        raise ValueError("arguments are only supported by predefined queries")
+    return query, ()
+
+
+def write_results(cursor: sqlite3.Cursor):
+    print("\t".join(d[0] for d in cursor.description or ()))
+    for row in cursor:
+        print("\t".join("" if v is None else str(v) for v in row))
+
+
+if __name__ == "__main__":
+    main()
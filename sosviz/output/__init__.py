@@ -1,14 +1,73 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright (c) 2024 Robin Jarry
 
-from . import dot, json, svg, text
+from concurrent.futures import ThreadPoolExecutor
+import pathlib
+import sys
+import typing
 
+from . import csv, dot, html, json, ndjson, parquet, svg, svgz, text
 
-FORMATS = {"dot": dot, "text": text, "json": json, "svg": svg}
+
+FORMATS = {
+    "dot": dot,
+    "text": text,
+    "json": json,
+    "svg": svg,
+    "svgz": svgz,
+    "html": html,
+    "ndjson": ndjson,
+    "csv": csv,
+    "parquet": parquet,
+}
+GRAPH_FORMATS = {"dot", "svg", "svgz"}
 DEFAULT_FORMAT = "svg"
 
 
-def render(report, fmt: str = DEFAULT_FORMAT, **opts):
+def render(report, fmt: str = DEFAULT_FORMAT, out: typing.TextIO = None, **opts):
     if fmt not in FORMATS:
         raise ValueError(f"unknown format: {fmt}")
-    FORMATS[fmt].render(report, **opts)
+    FORMATS[fmt].render(report, out or sys.stdout, **opts)
+
+
+def render_outputs(
+    report,
+    outputs: typing.List[typing.Tuple[str, typing.Optional[pathlib.Path]]],
+    **opts,
+):
+    """
+    Render the same report in several formats. Outputs without a path are
+    written on standard output. The graph is built once and shared by all
+    graph formats. All outputs are written concurrently so that dot layouts
+    run while other formats are serialized.
+    """
+    if sum(1 for _, path in outputs if path is None) > 1:
+        raise ValueError("only one output can be written on standard output")
+    num_graphs = sum(1 for fmt, _ in outputs if fmt in GRAPH_FORMATS)
+    if num_graphs:
+        opts["graph"] = graph = dot.SOSGraph(report, detail=opts.get("detail"))
+        if num_graphs > 1:
+            # generate the source once before sharing it between threads
+            graph.source()
+    if len(outputs) == 1:
+        render_output(report, *outputs[0], **opts)
+        return
+    with ThreadPoolExecutor(max_workers=len(outputs)) as pool:
+        futures = [
+            pool.submit(render_output, report, fmt, path, **opts)
+            for fmt, path in outputs
+        ]
+        for f in futures:
+            f.result()
+
+
+def render_output(report, fmt: str, path: typing.Optional[pathlib.Path], **opts):
+    if path is None:
+        render(report, fmt, sys.stdout, **opts)
+    elif getattr(FORMATS[fmt], "DIRECTORY", False):
+        # the format writes several files in the path directory
+        path.mkdir(parents=True, exist_ok=True)
+        render(report, fmt, sys.stdout, path=path, **opts)
+    else:
+        with path.open("w") as out:
+            render(report, fmt, out, path=path, **opts)
@@ -0,0 +1,37 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import contextlib
+import csv
+import pathlib
+import typing
+
+from .tables import TABLES, table_rows
+
+
+DIRECTORY = True
+
+
+def render(
+    report, out: typing.TextIO, path: typing.Optional[pathlib.Path] = None, **opts
+):
+    """
+    Write one CSV file per table in the path directory. Rows are appended to
+    existing files so that running on several reports produces a single file
+    per table. The header is only written in new files.
+    """
+    if path is None:
+        raise ValueError("csv output requires a directory path")
+    with contextlib.ExitStack() as stack:
+        writers = {}
+        for table, row in table_rows(report):
+            w = writers.get(table)
+            if w is None:
+                f = path / f"{table}.csv"
+                new = not f.exists() or f.stat().st_size == 0
+                w = writers[table] = csv.writer(
+                    stack.enter_context(f.open("a", newline=""))
+                )
+                if new:
+                    w.writerow(name for name, _ in TABLES[table])
+            w.writerow(row)
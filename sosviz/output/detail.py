@@ -0,0 +1,187 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import typing
+
+from ..collect import D
+
+
+DETAIL_LEVELS = {"full": None, "high": 64, "medium": 16, "low": 4}
+
+
+class Collapse:
+    """
+    Level of detail of a graph. Groups of at least threshold homogeneous
+    elements (OVS ports of the same type on a bridge, virtual interfaces of the
+    same kind attached to the same master, namespaces with the same name
+    prefix, VMs and PCI devices of the same model) are replaced by a single
+    summary node with counts and error indicators. Edges to collapsed nodes
+    are redirected to their summary node.
+    """
+
+    def __init__(self, graph, threshold: typing.Optional[int]):
+        self.graph = graph
+        self.threshold = threshold
+        self.aliases = {}
+        self.summaries = D()
+        self.emitted = set()
+        self.vms = None
+        self.netns = D()
+        if threshold is not None:
+            self.plan_vms()
+            self.plan_ovs_ports()
+            self.plan_interfaces()
+            self.plan_netns()
+            self.plan_pci_nics()
+
+    def redirect(self, name: str) -> str:
+        return self.aliases.get(name, name)
+
+    def absorb(self, name: str) -> bool:
+        """
+        Return True if the node is part of a collapsed group. The summary node
+        is emitted in place of the first member of its group.
+        """
+        summary = self.aliases.get(name)
+        if summary is None:
+            return False
+        if summary not in self.emitted:
+            self.emitted.add(summary)
+            s = self.summaries[summary]
+            self.graph.node(summary, s.labels, tooltip=s.tooltip, color=s.color)
+        return True
+
+    MAX_TOOLTIP = 32
+
+    def group(self, summary: str, what: str, members: list, color: str, *labels):
+        """
+        Collapse members, a list of (name, node id, has errors) tuples, if
+        there are enough of them.
+        """
+        if len(members) < self.threshold:
+            return
+        summary = self.graph.safe_id(summary)
+        errors = []
+        for name, node, error in members:
+            self.aliases[self.graph.safe_id(node)] = summary
+            if error:
+                errors.append(name)
+        labels = [f"<b>{len(members)} {what}</b>", *labels]
+        if errors:
+            labels.append(f'<font color="red">{len(errors)} with errors</font>')
+        tooltip = sorted(errors)[: self.MAX_TOOLTIP]
+        if len(errors) > self.MAX_TOOLTIP:
+            tooltip.append(f"... {len(errors) - self.MAX_TOOLTIP} more")
+        self.summaries[summary] = D(labels=labels, tooltip=tooltip, color=color)
+
+    def iface_errors(self, iface: D) -> bool:
+        if "LOWER_UP" not in iface.get("flags", ""):
+            return False
+        return any(
+            value and name in self.graph.NETDEV_ERRORS
+            for name, value in iface.get("stats", {}).items()
+        )
+
+    def plan_vms(self):
+        g = self.graph
+        vms = g.report.get("vms", D())
+        if len(vms) >= self.threshold:
+            self.vms = [f"<b>{len(vms)} VMs</b>"]
+            stopped = sum(1 for vm in vms.values() if vm.get("running") is False)
+            if stopped:
+                self.vms.append(f'<font color="gray">{stopped} not running</font>')
+
+        # host CPUs of all VMs on each NUMA node
+        for numa in g.report.get("numa", D()).values():
+            members = []
+            for vm in vms.values():
+                if any(numa.id in n.host_numa for n in vm.get("numa", D()).values()):
+                    members.append((vm.name, f"phy_cpus_{vm.name}_{numa.id}", False))
+            self.group(f"phy_cpus_vms_{numa.id}", "VMs", members, "blue")
+
+    SKIP_PORT_TYPES = {"vxlan", "geneve", "internal", "", "patch", "bond"}
+
+    def plan_ovs_ports(self):
+        g = self.graph
+        interfaces = g.report.get("interfaces", D())
+        for bridge, types in g.index.ports_by_bridge.items():
+            for kind, ports in types.items():
+                if kind in self.SKIP_PORT_TYPES:
+                    continue
+                members = [
+                    (p.name, g.ovs_port_node_id(p.name), any(g.ovs_stats_labels(p)))
+                    for p in ports
+                    if p.name not in interfaces
+                ]
+                self.group(
+                    f"ovs_br_{bridge}_{kind}", f"{kind} ports", members, "forestgreen"
+                )
+
+    def plan_interfaces(self):
+        g = self.graph
+        ports = g.report.get("ovs", D()).get("ports", D())
+        groups = D()
+        for iface in g.report.get("interfaces", D()).values():
+            kind = iface.get("kind")
+            if kind is None or kind == "openvswitch" or "device" in iface:
+                continue
+            if iface.name in ports:
+                master = ports[iface.name].bridge
+            else:
+                master = iface.get("master", "")
+            groups.setdefault((kind, master), []).append(
+                (iface.name, g.iface_node_id(iface.name, ""), self.iface_errors(iface))
+            )
+        for (kind, master), members in groups.items():
+            what = f"{kind} interfaces"
+            if master:
+                what += f" on {master}"
+            self.group(f"net__{kind}_{master}", what, members, "hotpink")
+
+    def plan_netns(self):
+        g = self.graph
+        prefixes = D()
+        for netns in g.report.get("netns", D()):
+            prefixes.setdefault(netns.split("-", 1)[0], []).append(netns)
+        for prefix, namespaces in prefixes.items():
+            if len(namespaces) < self.threshold:
+                continue
+            summary = self.netns[prefix] = D(
+                prefix=prefix, namespaces=len(namespaces), interfaces=0, kinds=D()
+            )
+            summary_id = g.safe_id(f"netns_summary_{prefix}")
+            errors = 0
+            for netns in namespaces:
+                for iface in g.report.netns[netns].values():
+                    if iface.get("link_type") == "loopback":
+                        continue
+                    kind = iface.get("kind", iface.get("link_type", "other"))
+                    summary.interfaces += 1
+                    summary.kinds[kind] = summary.kinds.get(kind, 0) + 1
+                    if self.iface_errors(iface):
+                        errors += 1
+                    self.aliases[g.safe_id(g.iface_node_id(iface.name, netns))] = (
+                        summary_id
+                    )
+            if errors:
+                summary.errors = errors
+
+    def plan_pci_nics(self):
+        g = self.graph
+        ethtool = g.report.get("ethtool", D())
+        for numa in g.report.get("numa", D()).values():
+            groups = D()
+            for nic in numa.get("pci_nics", D()).values():
+                key = (nic.pci_bridge, nic.device, nic.get("kernel_driver", ""))
+                error = bool(ethtool.get(nic.get("netdev"), D()).get("errors"))
+                groups.setdefault(key, []).append(
+                    (nic.pci_id, g.pci_node_id(nic.pci_id), error)
+                )
+            for (bridge, device, driver), members in groups.items():
+                self.group(
+                    f"pci_{bridge}_{device}_{driver}",
+                    f"{driver} devices" if driver else "devices",
+                    members,
+                    "darkorange",
+                    device,
+                )
@@ -2,78 +2,127 @@
 # Copyright (c) 2024 Robin Jarry
 
 
-import contextlib
+import io
 import os
 import re
-import secrets
-
-import graphviz
+import typing
 
 from ..bits import bit_list, human_readable
 from ..collect import D
-
-
-def render(report: D, **opts):
-    print(SOSGraph(report).source())
+from .detail import Collapse
+from .dotwriter import DotWriter, format_label
+from .index import build_index
+from .labels import (
+    SOFTIRQS,
+    ethtool_labels,
+    ovs_pmd_labels,
+    sar_cpu_labels,
+    sar_iface_labels,
+    softirq_labels,
+)
+
+
+def render(
+    report: D,
+    out: typing.TextIO,
+    graph: "SOSGraph" = None,
+    detail: typing.Optional[int] = None,
+    **opts,
+):
+    if graph is None:
+        graph = SOSGraph(report, detail=detail)
+    graph.write(out)
 
 
 class SOSGraph:
 
-    def __init__(self, report: D):
-        self.dot = graphviz.Graph(
-            name="sosviz",
-            node_attr={
-                "fontsize": "11",
-                "fontname": "monospace",
-                "margin": "0.05",
-                "shape": "rectangle",
-            },
-            edge_attr={
-                "fontsize": "11",
-                "fontname": "monospace",
-                "margin": "0",
-            },
-            graph_attr={
-                "fontsize": "11",
-                "fontname": "monospace",
-                "compound": "true",
-                "rankdir": "LR",
-            },
-        )
-        self.cur = self.dot
-        self.stack = []
+    GRAPH_ATTR = {
+        "fontsize": "11",
+        "fontname": "monospace",
+        "compound": "true",
+        "rankdir": "LR",
+    }
+    NODE_ATTR = {
+        "fontsize": "11",
+        "fontname": "monospace",
+        "margin": "0.05",
+        "shape": "rectangle",
+    }
+    EDGE_ATTR = {
+        "fontsize": "11",
+        "fontname": "monospace",
+        "margin": "0",
+    }
+
+    def __init__(
+        self,
+        report: D,
+        index: typing.Optional[D] = None,
+        detail: typing.Optional[int] = None,
+    ):
+        self.writer = None
+        self.dot_source = None
+        self.num_nodes = 0
+        self.num_edges = 0
+        self.ids = {}
         self.links = set()
         self.clusters = set()
+        self.cluster_ids = {}
         self.report = report
+        self.index = build_index(report) if index is None else index
+        self.collapse = Collapse(self, detail)
+
+    def write(self, out: typing.TextIO):
+        """
+        Build the graph and stream DOT statements into out as they are
+        generated. If the source was already generated, write it as is.
+        """
+        if self.dot_source is not None:
+            out.write(self.dot_source)
+            return
+        self.writer = DotWriter(
+            out, "sosviz", self.GRAPH_ATTR, self.NODE_ATTR, self.EDGE_ATTR
+        )
+        self.links = set()
+        self.clusters = set()
+        self.cluster_ids = {}
         self.build()
-
-    def source(self):
-        return self.dot.source
+        self.writer.close()
+        self.num_nodes = self.writer.num_nodes
+        self.num_edges = self.writer.num_edges
+        self.writer = None
+
+    def source(self) -> str:
+        if self.dot_source is None:
+            buf = io.StringIO()
+            self.write(buf)
+            self.dot_source = buf.getvalue()
+        return self.dot_source
 
     def safe_id(self, n):
-        return re.sub(r"\W", "_", n)
+        i = self.ids.get(n)
+        if i is None:
+            i = self.ids[n] = re.sub(r"\W", "_", n)
+        return i
 
     def edge(self, a, b, force=False, **kwargs):
-        a = self.safe_id(a)
-        b = self.safe_id(b)
+        a = self.collapse.redirect(self.safe_id(a))
+        b = self.collapse.redirect(self.safe_id(b))
+        if a == b:
+            # both ends were collapsed into the same summary node
+            return
         link = frozenset((a, b))
         if link in self.links and not force:
             # check for duplicate links
             return
         self.links.add(link)
-        if "label" in kwargs:
-            kwargs["label"] = format_label(kwargs["label"], max_width=30)
-        self.dot.edge(a, b, **kwargs)
+        label = kwargs.pop("label", None)
+        if label is not None:
+            label = format_label(label, max_width=30)
+        self.writer.edge(a, b, kwargs, label=label)
 
-    @contextlib.contextmanager
     def subgraph(self, name=None, **kwargs):
-        self.stack.append(self.cur)
-        with self.cur.subgraph(name=name, graph_attr=kwargs) as cur:
-            try:
-                self.cur = cur
-                yield cur
-            finally:
-                self.cur = self.stack.pop()
+        return self.writer.subgraph(name, kwargs)
 
     def cluster(self, label, **kwargs):
         kwargs["label"] = format_label(label)
@@ -82,9 +131,14 @@ class SOSGraph:
         kwargs["cluster"] = "true"
         if isinstance(label, list):
             label = label[0]
-        name = self.safe_id(label)
-        if name in self.clusters:
-            name += secrets.token_hex(8)
+        base = name = self.safe_id(label)
+        # number duplicate names in order of appearance to keep the output
+        # identical for identical reports
+        n = self.cluster_ids.get(base, 0)
+        while name in self.clusters:
+            n += 1
+            name = f"{base}_{n}"
+        self.cluster_ids[base] = n
         self.clusters.add(name)
         return self.subgraph(name=name, **kwargs)
 
@@ -94,13 +148,22 @@ class SOSGraph:
 
     def node(self, name: str, label: str, **kwargs):
         name = self.safe_id(name)
+        if self.collapse.absorb(name):
+            return
         if kwargs.get("shape", "rectangle") != "rectangle":
             kwargs.setdefault("margin", "0")
         if "tooltip" in kwargs:
             kwargs["tooltip"] = format_label(kwargs["tooltip"])
-        self.cur.node(name, format_label(label, max_width=30), **kwargs)
+        self.writer.node(name, kwargs, label=format_label(label, max_width=30))
 
-    def build(self):
+    def section(self, kind: str, name: str = "") -> bool:
+        """
+        Called before each top level part of the graph. Return False to skip
+        it. Subclasses may use it to split the graph in smaller ones.
+        """
+        return True
+
+    def host_labels(self) -> typing.List[str]:
         r = self.report
         label = [
             f"<b>{r.hostname} / <i>{r.hardware.system}</i></b>",
@@ -115,11 +178,23 @@ class SOSGraph:
             if r.ovs.config.get("dpdk_initialized"):
                 ovs += f" {r.ovs.config.dpdk_version}"
             label.append(ovs)
+        if "ovn" in r:
+            label.append(
+                f"OVN {len(r.ovn.chassis)} chassis {r.ovn.switches} switches "
+                f"{r.ovn.routers} routers"
+            )
+        return label
 
-        with self.cluster(label):
+    def build(self):
+        r = self.report
+        with self.cluster(self.host_labels()):
             # vms
+            if self.collapse.vms and self.section("VM"):
+                self.node("vms", self.collapse.vms)
             for vm in r.get("vms", {}).values():
-                with self.cluster(f"VM {vm.name}", style="solid"):
+                if self.collapse.vms or not self.section("VM", vm.name):
+                    continue
+                with self.cluster(self.vm_labels(vm), style="solid"):
                     for i, numa in vm.get("numa", {}).items():
                         with self.cluster(f"numa {i}", style="dotted"):
                             with self.group(rank="source"):
@@ -131,10 +206,13 @@ class SOSGraph:
             with self.cluster("networking"):
                 # openvswitch
                 for br in r.get("ovs", D()).get("bridges", D()).values():
-                    self.ovs_bridge(br)
+                    if self.section("OVS", br.name):
+                        self.ovs_bridge(br)
                 for port in r.get("ovs", D()).get("ports", D()).values():
                     if port.type in ("vxlan", "geneve", "internal", ""):
                         continue
+                    if not self.section("OVS", port.bridge):
+                        continue
                     if port.type == "patch":
                         self.edge(
                             self.ovs_br_node_id(port.bridge),
@@ -146,19 +224,43 @@ class SOSGraph:
                     self.ovs_port(port)
 
                 # linux networking
-                for iface in r.get("interfaces", D()).values():
-                    self.phy_iface(iface, netns="")
+                if self.section("interfaces"):
+                    for iface in r.get("interfaces", D()).values():
+                        self.phy_iface(iface, netns="")
 
                 for netns, ifaces in r.netns.items():
+                    prefix = netns.split("-", 1)[0]
+                    if prefix in self.collapse.netns:
+                        continue
+                    if not self.section("netns", prefix):
+                        continue
                     with self.cluster(f"netns {netns}", color="salmon", style="dashed"):
                         for iface in ifaces.values():
                             self.phy_iface(iface, netns=netns)
+                for summary in (
+                    *r.get("netns_summary", D()).values(),
+                    *self.collapse.netns.values(),
+                ):
+                    if self.section("netns", summary.prefix):
+                        self.netns_summary(summary)
 
             # physical CPU/memory
             for numa in r.get("numa", D()).values():
+                if not self.section("NUMA", str(numa.id)):
+                    continue
                 with self.cluster(f"phy numa {numa.id}"):
                     self.phy_numa(numa)
 
+    def vm_labels(self, vm: D):
+        labels = [f"VM {vm.name}"]
+        if vm.get("running") is False:
+            labels.append('<font color="gray">not running</font>')
+        if vm.get("emulator_pinning"):
+            labels.append(f"emulator CPUs {bit_list(vm.emulator_pinning)}")
+        for iothread, cpus in vm.get("iothread_pinning", {}).items():
+            labels.append(f"iothread {iothread} CPUs {bit_list(cpus)}")
+        return labels
+
     def vm_cpu_node_id(self, vm, numa):
         return f"{vm.name}_cpu_{numa.id}"
 
@@ -172,10 +274,7 @@ class SOSGraph:
             host_cpus.update(vm.vcpu_pinning.get(vcpu, set()))
         if host_cpus:
             labels.append(f"host CPUs {bit_list(host_cpus)}")
-        cpu_numas = set()
-        for n in self.report.numa.values():
-            if host_cpus & n.cpus:
-                cpu_numas.add(n.id)
+        cpu_numas = {self.cpu_numa(c) for c in host_cpus} - {None}
         if cpu_numas:
             labels.append(f'<font color="blue">host NUMA {bit_list(cpu_numas)}</font>')
         self.node(self.vm_cpu_node_id(vm, numa), labels, color="blue")
@@ -185,6 +284,9 @@ class SOSGraph:
             labels.append(f'<font color="red">host NUMA {h}</font>')
         self.node(self.vm_memory_node_id(vm, numa), labels, color="red")
 
+    def cpu_numa(self, cpu: int) -> typing.Optional[int]:
+        return self.index.cpu_numa.get(cpu)
+
     def vm_iface_node_id(self, name):
         return f"vm_iface_{name}"
 
@@ -200,7 +302,7 @@ class SOSGraph:
         elif "host_dev" in iface:
             color = "darkorange"
             name = iface.host_dev
-            peer = pci_node_id(iface.host_dev)
+            peer = self.pci_node_id(iface.host_dev)
         elif "net_dev" in iface:
             color = "hotpink"
             name = iface.net_dev
@@ -237,6 +339,8 @@ class SOSGraph:
             return
         if iface.name in "ovs-system" or re.match(r"(genev|vxlan)_sys_\d+", iface.name):
             return
+        if iface.get("link_type") == "loopback":
+            return
 
         labels = [f"<b>{iface.name}</b>"]
 
@@ -253,7 +357,7 @@ class SOSGraph:
             labels.append(iface.device)
             self.edge(
                 self.iface_node_id(iface.name, netns),
-                pci_node_id(iface.device),
+                self.pci_node_id(iface.device),
                 style="dashed",
                 color="darkorange",
             )
@@ -284,6 +388,11 @@ class SOSGraph:
                 labels.append(
                     f'<font color="red">{name} {human_readable(value)}</font>'
                 )
+        if not netns:
+            labels += sar_iface_labels(self.report, iface.name)
+            eth_labels, eth_tooltips = ethtool_labels(self.report, iface.name)
+            labels += eth_labels
+            tooltips += eth_tooltips
 
         color = "salmon" if netns else "hotpink"
         self.node(
@@ -300,12 +409,13 @@ class SOSGraph:
             else:
                 link_ns = netns
             link = self.find_iface(iface.link, link_ns)
-            self.edge(
-                self.iface_node_id(iface.name, netns),
-                self.iface_node_id(link.name, link_ns),
-                style="dashed",
-                color=color,
-            )
+            if link is not None:
+                self.edge(
+                    self.iface_node_id(iface.name, netns),
+                    self.iface_node_id(link.name, link_ns),
+                    style="dashed",
+                    color=color,
+                )
         if "master" in iface and iface.master != "ovs-system":
             self.edge(
                 self.iface_node_id(iface.master, netns),
@@ -322,18 +432,32 @@ class SOSGraph:
                 color="forestgreen",
             )
 
+    def netns_summary(self, summary: D):
+        labels = [
+            f"<b>{summary.namespaces} netns {summary.prefix}</b>",
+            f"{summary.interfaces} interfaces",
+        ]
+        for kind, num in sorted(summary.kinds.items()):
+            labels.append(f"<i>{num} {kind}</i>")
+        if summary.get("errors"):
+            labels.append(f'<font color="red">{summary.errors} with errors</font>')
+        self.node(f"netns_summary_{summary.prefix}", labels, color="salmon")
+
     def find_iface(self, name, netns):
         if netns:
+            if netns not in self.report.netns:
+                # namespace details not collected (see --netns-summary)
+                return None
             ifaces = self.report.netns[netns]
         else:
             ifaces = self.report.interfaces
         match = re.match(r"if(\d+)", name)
         if not match:
             return ifaces[name]
-        for iface in ifaces.values():
-            if iface.index == match.group(1):
-                return iface
-        raise KeyError(name)
+        return self.index.ifindex[netns][match.group(1)]
+
+    def pci_node_id(self, pci_id):
+        return f"pci_{pci_id}"
 
     def ovs_br_node_id(self, name):
         return f"ovs_br_{name}"
@@ -345,6 +469,13 @@ class SOSGraph:
             f"rules {br.of_rules}",
             f"ports {br.ports}",
         ]
+        if br.get("flows", D()).get("drop_rules"):
+            labels.append(f"drop rules {br.flows.drop_rules}")
+        if "fail_mode" in br:
+            labels.append(f"fail_mode {br.fail_mode}")
+        for c in br.get("controllers", []):
+            color = "forestgreen" if c.get("is_connected") else "red"
+            labels.append(f'<font color="{color}">controller {c.target}</font>')
         iface = self.report.interfaces.get(br.name, None)
         if iface is not None:
             for ip in self.report.interfaces[br.name].get("ip", []):
@@ -356,12 +487,13 @@ class SOSGraph:
                     if link_ns == "0":
                         link_ns = ""
                 link = self.find_iface(iface.link, link_ns)
-                self.edge(
-                    self.ovs_br_node_id(br.name),
-                    self.iface_node_id(link.name, link_ns),
-                    style="dashed",
-                    color="forestgreen",
-                )
+                if link is not None:
+                    self.edge(
+                        self.ovs_br_node_id(br.name),
+                        self.iface_node_id(link.name, link_ns),
+                        style="dashed",
+                        color="forestgreen",
+                    )
             if "master" in iface:
                 self.edge(
                     self.iface_node_id(iface.master, ""),
@@ -370,22 +502,26 @@ class SOSGraph:
                     color="forestgreen",
                 )
         self.node(
-            self.ovs_br_node_id(br.name), labels, color="forestgreen", shape="diamond"
+            self.ovs_br_node_id(br.name),
+            labels,
+            tooltip=self.ovs_flows_tooltip(br.get("flows", D())),
+            color="forestgreen",
+            shape="diamond",
         )
-        vxlan_ports = 0
-        geneve_ports = 0
-        for port in self.report.ovs.ports.values():
-            if port.bridge != br.name:
-                continue
-            if port.type == "vxlan":
-                vxlan_ports += 1
-            if port.type == "geneve":
-                geneve_ports += 1
+        ports = self.index.ports_by_bridge.get(br.name, D())
+        vxlan_ports = len(ports.get("vxlan", []))
+        geneve_ports = len(ports.get("geneve", []))
+        remotes = D()
+        for kind in "vxlan", "geneve":
+            remotes[kind] = {
+                p.remote_chassis for p in ports.get(kind, []) if "remote_chassis" in p
+            }
         if vxlan_ports > 0:
             vxlan_stub = self.ovs_br_node_id(br.name) + "_vxlans"
             self.node(
                 vxlan_stub,
                 f"{vxlan_ports} VXLAN ports",
+                tooltip=sorted(remotes.vxlan),
                 shape="ellipse",
                 color="forestgreen",
                 style="dashed",
@@ -401,6 +537,7 @@ class SOSGraph:
             self.node(
                 geneve_stub,
                 f"{geneve_ports} GENEVE ports",
+                tooltip=sorted(remotes.geneve),
                 shape="ellipse",
                 color="forestgreen",
                 style="dashed",
@@ -412,6 +549,25 @@ class SOSGraph:
                 style="solid",
             )
 
+    def ovs_flows_tooltip(self, flows: D):
+        tip = []
+        for table, rules in sorted(flows.get("tables", {}).items()):
+            tip.append(f"table {table} rules {rules}")
+        for name in "idle_timeouts", "hard_timeouts":
+            timeouts = ", ".join(
+                f"{t}s={n}" for t, n in sorted(flows.get(name, {}).items()) if t
+            )
+            if timeouts:
+                tip.append(f"{name} {timeouts}")
+        for name, attr in ("packets", "top_packets"), ("bytes", "top_bytes"):
+            for f in flows.get(attr, []):
+                value = human_readable(f[f"n_{name}"])
+                rule = f"{f.rule} actions={f.actions}"
+                if len(rule) > 80:
+                    rule = rule[:77] + "..."
+                tip.append(f"{name} {value} table={f.table} {rule}")
+        return tip
+
     def ovs_port_node_id(self, name):
         return f"ovs_port_{name}"
 
@@ -432,26 +588,22 @@ class SOSGraph:
             labels.append(f"state {state}")
         if "tag" in port:
             labels.append(f'<font color="forestgreen">VLAN {port.tag}</font>')
+        if "error" in port:
+            labels.append(f'<font color="red">{port.error}</font>')
         return labels
 
     def ovs_dpdk_labels(self, port: D):
         if "dpdk_devargs" in port.options:
-            numa_id = "N/A"
-            for numa in self.report.numa.values():
-                if port.options.dpdk_devargs in numa.pci_nics:
-                    numa_id = numa.id
-                    break
+            numa_id = self.index.pci_numa.get(port.options.dpdk_devargs, "N/A")
             yield f"{port.options.dpdk_devargs} NUMA {numa_id}"
 
         disabled = set()
         rxqs = []
-        for pmd in self.report.ovs.pmds.values():
-            for rxq in pmd.rxqs:
-                if rxq.port == port.name:
-                    if rxq.enabled:
-                        rxqs.append((rxq.rxq, pmd.core, pmd.numa))
-                    else:
-                        disabled.add(rxq.rxq)
+        for rxq, pmd in self.index.rxqs_by_port.get(port.name, []):
+            if rxq.enabled:
+                rxqs.append((rxq.rxq, pmd.core, pmd.numa))
+            else:
+                disabled.add(rxq.rxq)
 
         for rxq, core, numa in sorted(rxqs):
             yield f"rxq {rxq} cpu {core} NUMA {numa}"
@@ -502,7 +654,7 @@ class SOSGraph:
             if "dpdk_devargs" in port.options:
                 self.edge(
                     self.ovs_port_node_id(port.name),
-                    pci_node_id(port.options.dpdk_devargs),
+                    self.pci_node_id(port.options.dpdk_devargs),
                     style="dashed",
                     color="darkorange",
                 )
@@ -518,12 +670,13 @@ class SOSGraph:
                     if link_ns == "0":
                         link_ns = ""
                 link = self.find_iface(iface.link, link_ns)
-                self.edge(
-                    self.ovs_port_node_id(port.name),
-                    self.iface_node_id(link.name, link_ns),
-                    style="dashed",
-                    color="forestgreen",
-                )
+                if link is not None:
+                    self.edge(
+                        self.ovs_port_node_id(port.name),
+                        self.iface_node_id(link.name, link_ns),
+                        style="dashed",
+                        color="forestgreen",
+                    )
             if "master" in iface:
                 self.edge(
                     self.iface_node_id(iface.master, ""),
@@ -561,7 +714,7 @@ class SOSGraph:
                     labels.extend(self.ovs_dpdk_labels(member))
                     self.edge(
                         self.ovs_port_node_id(member.name),
-                        pci_node_id(member.options.dpdk_devargs),
+                        self.pci_node_id(member.options.dpdk_devargs),
                         style="dashed",
                         color="darkorange",
                     )
@@ -579,25 +732,29 @@ class SOSGraph:
                     color="forestgreen",
                 )
 
-    def irq_counters(self, cpu: int) -> tuple[int, int]:
-        counter = 0
-        bound = 0
-        for irq in self.report.irqs.values():
-            if not irq.irq.isdigit():
-                continue
-            if cpu in irq.get("effective_affinity", []):
-                bound += 1
-            counter += irq.counters[cpu]
-        return counter, bound
+    def irq_counters(self, cpu: int) -> typing.Tuple[int, int]:
+        return self.index.irq_counters.get(cpu, 0), self.index.irq_bound.get(cpu, 0)
+
+    def softirq_counters(self, cpu: int) -> D:
+        counters = D()
+        for t in SOFTIRQS:
+            values = self.report.get("softirqs", D()).get(t, [])
+            if cpu < len(values) and values[cpu]:
+                counters[t] = values[cpu]
+        return counters
 
-    def irq_counters_tooltip(self, cpus: set[int]) -> str:
+    def irq_counters_tooltip(self, cpus: typing.Set[int]) -> str:
         tooltip = []
         for c in cpus:
             counter, bound = self.irq_counters(c)
-            if counter < 42:  # XXX: how about 1337 maybe?
+            softirqs = self.softirq_counters(c)
+            if counter < 42 and not softirqs:  # XXX: how about 1337 maybe?
                 continue
             counter = human_readable(counter)
-            tooltip.append(f"CPU {c} bound_irqs={bound} interrupts={counter}")
+            line = f"CPU {c} bound_irqs={bound} interrupts={counter}"
+            for t, value in softirqs.items():
+                line += f" {t.lower()}={human_readable(value)}"
+            tooltip.append(line)
         return format_label(tooltip)
 
     def phy_numa(self, numa: D):
@@ -617,7 +774,14 @@ class SOSGraph:
                     continue
                 p = ovs_pmds.setdefault(
                     pmd.core,
-                    D(cpu=pmd.core, isolated=pmd.isolated, rxqs=0, usage=0),
+                    D(
+                        cpu=pmd.core,
+                        isolated=pmd.get("isolated"),
+                        rxqs=0,
+                        usage=0,
+                        stats=pmd.get("stats"),
+                        perf=pmd.get("perf"),
+                    ),
                 )
                 for rxq in pmd.rxqs:
                     if rxq.enabled:
@@ -626,16 +790,23 @@ class SOSGraph:
 
             if ovs_pmds:
                 labels = ["<b>OVS DPDK</b>"]
+                tooltips = []
                 for pmd in ovs_pmds.values():
                     irqs, _ = self.irq_counters(pmd.cpu)
                     labels.append(
                         f"CPU {pmd.cpu} rxqs={pmd.rxqs} usage={pmd.usage}% irqs={human_readable(irqs)}"
                     )
+                    pmd_labels, pmd_tooltips = ovs_pmd_labels(pmd)
+                    labels += pmd_labels
+                    tooltips += pmd_tooltips
+                irq_tooltip = self.irq_counters_tooltip(ovs_pmds.keys())
+                if irq_tooltip:
+                    tooltips.append(irq_tooltip)
 
                 self.node(
                     f"phy_cpus_ovs_{numa.id}",
                     labels,
-                    tooltip=self.irq_counters_tooltip(ovs_pmds.keys()),
+                    tooltip=tooltips,
                     color="blue",
                 )
 
@@ -648,10 +819,20 @@ class SOSGraph:
                         continue
                     host_cpus = set()
                     for vcpu in vnuma.vcpus:
-                        host_cpus.update(vm.vcpu_pinning[vcpu])
+                        host_cpus.update(vm.vcpu_pinning.get(vcpu, set()))
+                    if not host_cpus and "numa_placement" in vm:
+                        cpuset = vm.numa_placement.get("cpuset", set())
+                        host_cpus = cpuset & numa.cpus
                     self.node(
                         f"phy_cpus_{vm.name}_{numa.id}",
-                        [f"<b>VM {vm.name}</b>", f"CPUs {bit_list(host_cpus)}"],
+                        [
+                            f"<b>VM {vm.name}</b>",
+                            f"CPUs {bit_list(host_cpus)}",
+                            *sar_cpu_labels(self.report, host_cpus),
+                            *softirq_labels(
+                                self.report, self.index, host_cpus, isolated=True
+                            ),
+                        ],
                         tooltip=self.irq_counters_tooltip(host_cpus),
                         color="blue",
                     )
@@ -664,6 +845,10 @@ class SOSGraph:
                     [
                         "<b><i>Isolated</i></b>",
                         f"<i>CPUs {bit_list(isolated_cpus)}</i>",
+                        *sar_cpu_labels(self.report, isolated_cpus),
+                        *softirq_labels(
+                            self.report, self.index, isolated_cpus, isolated=True
+                        ),
                     ],
                     tooltip=self.irq_counters_tooltip(isolated_cpus),
                     color="cornflowerblue",
@@ -671,7 +856,12 @@ class SOSGraph:
 
             self.node(
                 f"phy_cpus_housekeeping_{numa.id}",
-                ["<b>Housekeeping</b>", f"CPUs {bit_list(housekeeping_cpus)}"],
+                [
+                    "<b>Housekeeping</b>",
+                    f"CPUs {bit_list(housekeeping_cpus)}",
+                    *sar_cpu_labels(self.report, housekeeping_cpus),
+                    *softirq_labels(self.report, self.index, housekeeping_cpus),
+                ],
                 tooltip=self.irq_counters_tooltip(housekeeping_cpus),
                 color="blue",
             )
@@ -702,86 +892,26 @@ class SOSGraph:
 
         for bridge, nics in pci_bridges.items():
             if len(nics) == 1:
-                labels = [f"<b>{nics[0].pci_id}</b>"]
-                if "kernel_driver" in nics[0]:
-                    labels.append(nics[0].kernel_driver)
-                self.node(
-                    pci_node_id(nics[0].pci_id),
-                    labels,
-                    tooltip=nics[0].device,
-                    color="darkorange",
-                )
+                self.phy_pci_nic(nics[0])
             else:
                 with self.cluster(
                     f"PCI bridge {bridge}", style="dashed", color="darkorange"
                 ):
                     for nic in nics:
-                        labels = [f"<b>{nic.pci_id}</b>"]
-                        if "kernel_driver" in nic:
-                            labels.append(nic.kernel_driver)
-                        self.node(
-                            pci_node_id(nic.pci_id),
-                            labels,
-                            tooltip=nic.device,
-                            color="darkorange",
-                        )
-
-
-def pci_node_id(pci_id):
-    return f"pci_{pci_id}"
-
-
-def wrap_text(text: str, margin: int) -> list[str]:
-    lines = []
-    more = True
-
-    while more:
-        if len(text) <= margin:
-            # whole text fits in a single line
-            line = text
-            more = False
-        else:
-            # find split point, preferably before margin
-            split = -1
-            width = 0
-            markup = 0
-            for w, t in enumerate(text):
-                if width >= margin and split != -1:
-                    break
-                if t in " \t,>":
-                    split = w
-                if t == "<":
-                    markup += 1
-                elif t == ">":
-                    markup -= 1
-                if markup == 0:
-                    width += 1
-            if split == -1:
-                # no space found to split, print a long line
-                line = text
-                more = False
-            else:
-                line = text[: split + 1]
-                text = text[split + 1 :]
-                # find start of next word
-                while text and text[0] in " \t":
-                    text = text[1:]
-                if not text:
-                    # only trailing whitespace, we're done
-                    more = False
-        lines.append(line)
-
-    return lines
-
-
-def format_label(lines: list[str], max_width: int = 0) -> str:
-    if isinstance(lines, str):
-        lines = [lines]
-    if max_width:
-        out = []
-        for line in lines:
-            out += wrap_text(line, max_width)
-        lines = out
-    if any(line.startswith("<") for line in lines):
-        return "<" + "<br/>".join(lines) + ">"
-    return "\\n".join(lines)
+                        self.phy_pci_nic(nic)
+
+    def phy_pci_nic(self, nic: D):
+        labels = [f"<b>{nic.pci_id}</b>"]
+        if "kernel_driver" in nic:
+            labels.append(nic.kernel_driver)
+        tooltips = [nic.device]
+        if "netdev" in nic:
+            eth_labels, eth_tooltips = ethtool_labels(self.report, nic.netdev)
+            labels += eth_labels
+            tooltips += eth_tooltips
+        self.node(
+            self.pci_node_id(nic.pci_id),
+            labels,
+            tooltip=tooltips,
+            color="darkorange",
+        )
@@ -0,0 +1,231 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import contextlib
+import functools
+import re
+import typing
+
+
+class DotWriter:
+    """
+    Minimal DOT writer that streams statements into a text file as they are
+    generated instead of building the whole graph in memory.
+    """
+
+    def __init__(
+        self,
+        out: typing.TextIO,
+        name: str,
+        graph_attr: dict,
+        node_attr: dict,
+        edge_attr: dict,
+    ):
+        self.out = out
+        self.depth = 1
+        # ids of the open subgraphs, innermost last
+        self.scope = ()
+        self.num_scopes = 0
+        # scope in which each node was declared
+        self.node_scopes = {}
+        # edges waiting for one of their nodes to be declared
+        self.waiting = {}
+        # edges waiting for a subgraph to become the innermost open one
+        self.pending = {}
+        self.num_nodes = 0
+        self.num_edges = 0
+        out.write(f"graph {quote(name)} {{\n")
+        self.statement("graph", graph_attr)
+        self.statement("node", node_attr)
+        self.statement("edge", edge_attr)
+
+    def close(self):
+        # edges which reference nodes that were never declared
+        for edges in self.waiting.values():
+            for _, _, stmt in edges:
+                self.statement(stmt)
+        self.waiting.clear()
+        self.out.write("}\n")
+
+    def statement(
+        self,
+        stmt: str,
+        attrs: typing.Optional[dict] = None,
+        label: typing.Optional[str] = None,
+    ):
+        if label is not None or attrs:
+            stmt += attr_list(label, attrs or {})
+        self.out.write("\t" * self.depth + stmt + "\n")
+
+    def node(self, name: str, attrs: dict, label: typing.Optional[str] = None):
+        self.num_nodes += 1
+        self.statement(quote(name), attrs, label)
+        if name not in self.node_scopes:
+            self.node_scopes[name] = self.scope
+            for a, b, stmt in self.waiting.pop(name, ()):
+                self.place_edge(a, b, stmt)
+
+    def edge(self, a: str, b: str, attrs: dict, label: typing.Optional[str] = None):
+        self.num_edges += 1
+        stmt = f"{quote(a)} -- {quote(b)}" + attr_list(label, attrs)
+        self.place_edge(a, b, stmt)
+
+    def place_edge(self, a: str, b: str, stmt: str):
+        """
+        An edge statement makes its nodes members of the subgraph where it is
+        written. Write it in the innermost subgraph which contains both nodes.
+        If that subgraph is not the current one, hold the edge until it is
+        closed back to. Edges are never held longer than the subgraph which
+        contains both of their nodes.
+        """
+        for n in a, b:
+            if n not in self.node_scopes:
+                # only know where to write it once the node is declared
+                self.waiting.setdefault(n, []).append((a, b, stmt))
+                return
+        scope = common_scope(self.node_scopes[a], self.node_scopes[b], self.scope)
+        if scope == self.scope:
+            self.statement(stmt)
+        else:
+            self.pending.setdefault(scope, []).append(stmt)
+
+    @contextlib.contextmanager
+    def subgraph(self, name: typing.Optional[str] = None, attrs: dict = None):
+        if name is None:
+            self.statement("{")
+        else:
+            self.statement(f"subgraph {quote(name)} {{")
+        parent = self.scope
+        self.num_scopes += 1
+        self.scope = (*parent, self.num_scopes)
+        self.depth += 1
+        try:
+            if attrs:
+                self.statement("graph", attrs)
+            yield self
+        finally:
+            self.depth -= 1
+            self.scope = parent
+            self.statement("}")
+            for stmt in self.pending.pop(parent, ()):
+                self.statement(stmt)
+
+
+def common_scope(*scopes: typing.Tuple[int, ...]) -> typing.Tuple[int, ...]:
+    """
+    Return the innermost subgraph which contains all given ones.
+    """
+    scope = min(scopes, key=len)
+    for other in scopes:
+        while other[: len(scope)] != scope:
+            scope = scope[:-1]
+    return scope
+
+
+HTML_RE = re.compile(r"<.*>$", re.DOTALL)
+ID_RE = re.compile(r"([a-zA-Z_][a-zA-Z0-9_]*|-?(\.[0-9]+|[0-9]+(\.[0-9]*)?))$")
+KEYWORDS = {"node", "edge", "graph", "digraph", "subgraph", "strict"}
+UNESCAPED_QUOTE_RE = re.compile(r'((?:\\\\)*)\\?"')
+
+
+@functools.lru_cache(maxsize=16384)
+def quote(s: str) -> str:
+    """
+    Return a DOT identifier, quoted if needed. HTML strings are left as is.
+    """
+    if HTML_RE.match(s):
+        return s
+    if ID_RE.match(s) and s.lower() not in KEYWORDS:
+        return s
+    return '"' + UNESCAPED_QUOTE_RE.sub(r'\1\\"', s) + '"'
+
+
+def attr_list(label: typing.Optional[str], attrs: dict) -> str:
+    if label is None and not attrs:
+        return ""
+    items = []
+    if label is not None:
+        items.append(f"label={quote(label)}")
+    for key, value in sorted(attrs.items()):
+        if value is not None:
+            items.append(f"{quote(key)}={quote(value)}")
+    return " [" + " ".join(items) + "]"
+
+
+SPLIT_RE = re.compile(r"[ \t,]")
+
+
+@functools.lru_cache(maxsize=16384)
+def wrap_text(text: str, margin: int) -> typing.Tuple[str, ...]:
+    lines = []
+    start = 0
+    end = len(text)
+    if "<" in text or ">" in text:
+        find_split = split_markup
+    else:
+        find_split = split_plain
+
+    while end - start > margin:
+        # find split point, preferably before margin
+        split = find_split(text, start, margin)
+        if split == -1:
+            # no space found to split, print a long line
+            break
+        lines.append(text[start : split + 1])
+        # find start of next word
+        start = split + 1
+        while start < end and text[start] in " \t":
+            start += 1
+        if start == end:
+            # only trailing whitespace, we're done
+            return tuple(lines)
+
+    # remaining text fits in a single line
+    lines.append(text[start:])
+    return tuple(lines)
+
+
+def split_plain(text: str, start: int, margin: int) -> int:
+    # no markup, every character is visible
+    split = -1
+    for c in " \t,":
+        split = max(split, text.rfind(c, start, start + margin))
+    if split == -1:
+        match = SPLIT_RE.search(text, start + margin)
+        if match is not None:
+            split = match.start()
+    return split
+
+
+def split_markup(text: str, start: int, margin: int) -> int:
+    split = -1
+    width = 0
+    markup = 0
+    # only look at small windows to avoid copying the whole remaining text
+    window = max(4 * margin, 64)
+    for pos in range(start, len(text), window):
+        for i, t in enumerate(text[pos : pos + window], pos):
+            if width >= margin and split != -1:
+                return split
+            if t in " \t,>":
+                split = i
+            if t == "<":
+                markup += 1
+            elif t == ">":
+                markup -= 1
+            if markup == 0:
+                width += 1
+    return split
+
+
+def format_label(lines: typing.List[str], max_width: int = 0) -> str:
+    if isinstance(lines, str):
+        lines = [lines]
+    if max_width:
+        out = []
+        for line in lines:
+            out += wrap_text(line, max_width)
+        lines = out
+    if any(line.startswith("<") for line in lines):
+        return "<" + "<br/>".join(lines) + ">"
+    return "\\n".join(lines)
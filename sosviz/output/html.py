@@ -0,0 +1,216 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import collections
+import html
+import os
+import pathlib
+import typing
+
+from ..collect import D, process_map
+from .dot import SOSGraph
+from .svg import DEFAULT_TIMEOUT, auto_layout
+from .svgcompact import compact_svg, report_size
+
+
+def render(
+    report,
+    out: typing.TextIO,
+    *,
+    path: typing.Optional[pathlib.Path] = None,
+    cache_dir: typing.Optional[pathlib.Path] = None,
+    detail: typing.Optional[int] = None,
+    timeout: typing.Optional[float] = DEFAULT_TIMEOUT,
+    verbose: bool = False,
+    **opts,
+):
+    """
+    Split the graph into an overview and one graph per VM, OVS bridge,
+    network namespace group and physical NUMA node. All graphs are laid out
+    in parallel and written as SVG files next to path. An HTML index linking
+    them together is written in out.
+    """
+    if path is None:
+        raise ValueError("html output requires a file path")
+    parts = SectionGraph(report, path.stem, detail=detail)
+    # walk the whole graph once to find which section owns each node
+    with open(os.devnull, "w", encoding="utf-8") as null:
+        parts.write(null)
+    sections = [OVERVIEW, *parts.counts]
+    images = process_map(
+        layout_section,
+        sections,
+        min_items=2,
+        initializer=set_worker,
+        initargs=(parts, cache_dir, timeout),
+    )
+    before = after = 0
+    for section, (size, data) in zip(sections, images):
+        (path.parent / parts.filename(section)).write_bytes(data)
+        before += size
+        after += len(data)
+    if verbose:
+        report_size("html", before, after)
+    write_index(out, parts, sections)
+
+
+OVERVIEW = "overview"
+WORKER = D()
+
+
+def set_worker(
+    parts: "SectionGraph",
+    cache_dir: typing.Optional[pathlib.Path],
+    timeout: typing.Optional[float],
+):
+    WORKER.parts = parts
+    WORKER.cache_dir = cache_dir
+    WORKER.timeout = timeout
+
+
+def layout_section(section: str) -> typing.Tuple[int, bytes]:
+    parts = WORKER.parts
+    graph = SectionGraph(parts.report, parts.prefix, section, parts)
+    # sections cannot be collapsed independently of the others
+    data = auto_layout(graph, "svg", WORKER.timeout, WORKER.cache_dir, collapse=False)
+    return len(data), compact_svg(data)
+
+
+def write_index(out: typing.TextIO, parts: "SectionGraph", sections: typing.List[str]):
+    hostname = html.escape(parts.report.hostname)
+    out.write(f"""<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>sosviz {hostname}</title>
+</head>
+<body>
+<h1>{hostname}</h1>
+<ul>
+""")
+    for section in sections:
+        href = html.escape(parts.filename(section))
+        out.write(f'<li><a href="{href}">{html.escape(section)}</a>')
+        if section in parts.counts:
+            out.write(f" ({parts.counts[section]} nodes)")
+        out.write("</li>\n")
+    overview = html.escape(parts.filename(OVERVIEW))
+    out.write(f"""</ul>
+<object data="{overview}" type="image/svg+xml"></object>
+</body>
+</html>
+""")
+
+
+class SectionGraph(SOSGraph):
+    """
+    Graph restricted to one section of the host (see SOSGraph.section). Nodes
+    linked to other sections are replaced by stubs pointing to the SVG file of
+    their section.
+
+    Without a section, the whole graph is walked to record which section
+    declares each node and how many links exist between sections. The other
+    section graphs reuse this information from parts.
+    """
+
+    SECTION_COLORS = {
+        "VM": "black",
+        "OVS": "forestgreen",
+        "interfaces": "hotpink",
+        "netns": "salmon",
+        "NUMA": "blue",
+    }
+
+    def __init__(
+        self,
+        report: D,
+        prefix: str,
+        only: typing.Optional[str] = None,
+        parts: typing.Optional["SectionGraph"] = None,
+        detail: typing.Optional[int] = None,
+    ):
+        if parts is None:
+            super().__init__(report, detail=detail)
+        else:
+            super().__init__(report, parts.index, parts.collapse.threshold)
+        self.prefix = prefix
+        self.only = only
+        self.current = None
+        self.declared = set()
+        self.pairs = set()
+        if parts is None:
+            self.owners = {}
+            self.titles = {}
+            self.counts = collections.Counter()
+            self.crosslinks = collections.Counter()
+        else:
+            self.owners = parts.owners
+            self.titles = parts.titles
+            self.counts = parts.counts
+            self.crosslinks = parts.crosslinks
+
+    def filename(self, section: str) -> str:
+        return f"{self.prefix}_{self.safe_id(section)}.svg"
+
+    def section(self, kind: str, name: str = "") -> bool:
+        self.current = f"{kind} {name}".strip()
+        return self.only is None or self.current == self.only
+
+    def node(self, name: str, label: str, **kwargs):
+        name = self.safe_id(name)
+        if self.only is None and name not in self.collapse.aliases:
+            self.owners[name] = self.current
+            self.titles[name] = label[0] if isinstance(label, list) else label
+            self.counts[self.current] += 1
+        self.declared.add(name)
+        super().node(name, label, **kwargs)
+
+    def edge(self, a, b, force=False, **kwargs):
+        a = self.collapse.redirect(self.safe_id(a))
+        b = self.collapse.redirect(self.safe_id(b))
+        self.pairs.add((a, b))
+        super().edge(a, b, force, **kwargs)
+
+    def build(self):
+        if self.only == OVERVIEW:
+            self.overview()
+            return
+        super().build()
+        if self.only is None:
+            for a, b in self.pairs:
+                sections = {self.owners.get(a), self.owners.get(b)} - {None}
+                if len(sections) == 2:
+                    self.crosslinks[tuple(sorted(sections))] += 1
+            return
+        # cross-links to the other sections
+        referenced = {n for pair in self.pairs for n in pair}
+        for name in sorted(referenced - self.declared):
+            owner = self.owners.get(name)
+            if owner is None:
+                continue
+            self.node(
+                name,
+                [self.titles[name], f"<i>{owner}</i>"],
+                URL=self.filename(owner),
+                target="_top",
+                color=self.SECTION_COLORS[owner.split()[0]],
+                style="dashed",
+            )
+
+    def overview(self):
+        with self.cluster(self.host_labels()):
+            for section, count in self.counts.items():
+                self.node(
+                    f"section_{section}",
+                    [f"<b>{section}</b>", f"{count} nodes"],
+                    URL=self.filename(section),
+                    target="_top",
+                    color=self.SECTION_COLORS[section.split()[0]],
+                )
+        for (a, b), count in sorted(self.crosslinks.items()):
+            self.edge(
+                f"section_{a}",
+                f"section_{b}",
+                label=f"{count} links",
+                color="gray",
+            )
@@ -0,0 +1,60 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+from ..collect import D
+
+
+def build_index(report: D) -> D:
+    """
+    Precompute the relationships between report entities that renderers look
+    up repeatedly. Each collection is scanned only once.
+    """
+    index = D(
+        rxqs_by_port=D(),
+        ports_by_bridge=D(),
+        ifindex=D(),
+        cpu_numa=D(),
+        pci_numa=D(),
+        irq_counters=D(),
+        irq_bound=D(),
+        softirq_totals=D(),
+    )
+
+    ovs = report.get("ovs", D())
+    for pmd in ovs.get("pmds", D()).values():
+        for rxq in pmd.rxqs:
+            index.rxqs_by_port.setdefault(rxq.port, []).append((rxq, pmd))
+    for port in ovs.get("ports", D()).values():
+        by_type = index.ports_by_bridge.setdefault(port.bridge, D())
+        by_type.setdefault(port.get("type", ""), []).append(port)
+
+    for netns, ifaces in (
+        ("", report.get("interfaces", D())),
+        *report.get("netns", D()).items(),
+    ):
+        by_index = index.ifindex[netns] = D()
+        for iface in ifaces.values():
+            if "index" in iface:
+                by_index[iface.index] = iface
+
+    for numa in report.get("numa", D()).values():
+        for cpu in numa.get("cpus", ()):
+            index.cpu_numa[cpu] = numa.id
+        for pci_id in numa.get("pci_nics", D()):
+            index.pci_numa[pci_id] = numa.id
+    for cpu, node in enumerate(report.get("cpu_topology", D()).get("node", [])):
+        if node is not None:
+            index.cpu_numa[cpu] = node
+
+    for irq in report.get("irqs", D()).values():
+        if not irq.irq.isdigit():
+            continue
+        for cpu, counter in enumerate(irq.counters):
+            index.irq_counters[cpu] = index.irq_counters.get(cpu, 0) + counter
+        for cpu in irq.get("effective_affinity", ()):
+            index.irq_bound[cpu] = index.irq_bound.get(cpu, 0) + 1
+
+    for softirq, counters in report.get("softirqs", D()).items():
+        index.softirq_totals[softirq] = sum(counters)
+
+    return index
@@ -1,14 +1,19 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright (c) 2024 Robin Jarry
 
+import collections.abc
 import json
+import typing
 
 
-def render(report, **opts):
-    print(json.dumps(report, default=cast_json))
+def render(report, out: typing.TextIO, **opts):
+    json.dump(report, out, default=cast_json)
+    out.write("\n")
 
 
 def cast_json(obj):
     if isinstance(obj, set):
         return list(obj)
+    if isinstance(obj, collections.abc.Mapping):
+        return dict(obj)
     return obj
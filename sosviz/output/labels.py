@@ -0,0 +1,141 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import typing
+
+from ..bits import bit_list, human_readable
+from ..collect import D
+
+
+SOFTIRQS = ("NET_RX", "NET_TX", "TIMER")
+
+
+def ethtool_labels(
+    report: D, name: str
+) -> typing.Tuple[typing.List[str], typing.List[str]]:
+    dev = report.get("ethtool", D()).get(name)
+    if dev is None:
+        return [], []
+
+    labels = []
+    for counter, value in dev.get("errors", {}).items():
+        labels.append(f'<font color="red">{counter} {human_readable(value)}</font>')
+    for counter, err in dev.get("queue_errors", {}).items():
+        labels.append(
+            f'<font color="red">{counter} {human_readable(err.total)} '
+            f"queues {bit_list(err.queues)}</font>"
+        )
+
+    tooltips = []
+    for kind in "channels", "rings":
+        settings = dev.get(kind, D())
+        maximum = settings.get("max", D())
+        for key, value in settings.get("current", D()).items():
+            tooltip = f"{kind} {key} {value}"
+            if key in maximum:
+                tooltip += f"/{maximum[key]}"
+            tooltips.append(tooltip)
+            if (
+                kind == "rings"
+                and labels
+                and key in ("rx", "tx")
+                and value < maximum.get(key, 0)
+            ):
+                labels.append(
+                    f'<font color="darkorange">{key} ring {value}/{maximum[key]}</font>'
+                )
+
+    return labels, tooltips
+
+
+def softirq_labels(
+    report: D, index: D, cpus: typing.Set[int], isolated: bool = False
+) -> typing.List[str]:
+    """
+    Sum the NET_RX, NET_TX and TIMER softirqs of a group of CPUs. Flag the
+    types for which the group gets more than twice its fair share (or more
+    than its fair share for isolated CPUs).
+    """
+    parts = []
+    for t in SOFTIRQS:
+        values = report.get("softirqs", D()).get(t)
+        total = index.softirq_totals.get(t)
+        if not values or not total:
+            continue
+        group = sum(values[c] for c in cpus if c < len(values))
+        if not group:
+            continue
+        part = f"{t} {human_readable(group)}"
+        fair_share = len(cpus) / len(values)
+        if group / total > (1 if isolated else 2) * fair_share:
+            part = f'<font color="red">{part}</font>'
+        parts.append(part)
+    if not parts:
+        return []
+    return [f"softirq {' '.join(parts)}"]
+
+
+def ovs_pmd_labels(pmd: D) -> typing.Tuple[typing.List[str], typing.List[str]]:
+    labels = []
+    tooltips = []
+    stats = pmd.get("stats")
+    if stats and stats.packets:
+        label = f"pkts={human_readable(stats.packets)} busy={stats.busy}%"
+        if stats.cycles_per_packet:
+            label += f" cycles/pkt={stats.cycles_per_packet:.0f}"
+        labels.append(label)
+        if stats.failed_upcalls:
+            labels.append(
+                f'<font color="red">failed upcalls {human_readable(stats.failed_upcalls)}</font>'
+            )
+        tooltips.append(
+            f"CPU {pmd.cpu} emc={stats.emc_rate}% smc={stats.smc_rate}% "
+            f"megaflow={stats.megaflow_rate}% "
+            f"upcalls={human_readable(stats.upcalls)}"
+        )
+    perf = pmd.get("perf")
+    if perf and perf.packets:
+        if perf.lost_upcalls:
+            labels.append(
+                f'<font color="red">lost upcalls {human_readable(perf.lost_upcalls)}</font>'
+            )
+        tooltips.append(
+            f"CPU {pmd.cpu} busy_iterations={perf.busy_iterations}% "
+            f"cycles/pkt={perf.cycles_per_packet:.0f} "
+            f"us/upcall={perf.us_per_upcall}"
+        )
+    return labels, tooltips
+
+
+def sar_cpu_labels(report: D, cpus: typing.Set[int]) -> typing.List[str]:
+    sar_cpus = report.get("sar", D()).get("cpus", D())
+    loads = []
+    for c in cpus:
+        busy = sar_cpus.get(str(c), D()).get("busy")
+        if busy and busy.samples:
+            loads.append(busy.p95)
+    if not loads:
+        return []
+    avg = sum(loads) / len(loads)
+    label = f"p95 load {avg:.0f}% max {max(loads):.0f}%"
+    if max(loads) >= 90:
+        label = f'<font color="red">{label}</font>'
+    return [label]
+
+
+def sar_iface_labels(report: D, name: str) -> typing.List[str]:
+    iface = report.get("sar", D()).get("interfaces", D()).get(name)
+    if iface is None:
+        return []
+    labels = []
+    if "rx_pps" in iface and "tx_pps" in iface:
+        rx = human_readable(iface.rx_pps.p95)
+        tx = human_readable(iface.tx_pps.p95)
+        labels.append(f"p95 pps rx {rx} tx {tx}")
+    for key in "rx_drops", "tx_drops":
+        drops = iface.get(key)
+        if drops and drops.max:
+            labels.append(
+                f'<font color="red">{key} p95 {drops.p95}/s max {drops.max}/s</font>'
+            )
+    return labels
@@ -0,0 +1,49 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import json
+import typing
+
+from ..collect import D
+from .json import cast_json
+
+
+def render(report, out: typing.TextIO, **opts):
+    """
+    Write one JSON object per line and per entity of the report. Each record
+    has the entity type, the host name, a key which is stable across runs and
+    unique per type and host, and the entity data.
+    """
+    host = report.get("hostname")
+    for kind, key, data in records(report):
+        record = {"type": kind, "host": host, "key": key, "data": data}
+        out.write(json.dumps(record, default=cast_json))
+        out.write("\n")
+
+
+def records(report: D) -> typing.Iterator[typing.Tuple[str, str, dict]]:
+    for name, iface in report.get("interfaces", D()).items():
+        yield "interface", name, iface
+
+    for netns, ifaces in report.get("netns", D()).items():
+        for name, iface in ifaces.items():
+            yield "netns_interface", f"{netns}/{name}", {"netns": netns, **iface}
+
+    ovs = report.get("ovs", D())
+    for name, port in ovs.get("ports", D()).items():
+        yield "ovs_port", name, port
+    for pmd in ovs.get("pmds", D()).values():
+        yield "ovs_pmd", str(pmd.core), {k: v for k, v in pmd.items() if k != "rxqs"}
+        for rxq in pmd.rxqs:
+            yield "ovs_rxq", f"{rxq.port}/{rxq.rxq}", {"core": pmd.core, **rxq}
+
+    for name, irq in report.get("irqs", D()).items():
+        yield "irq", name, irq
+
+    for name, vm in report.get("vms", D()).items():
+        yield "vm", name, vm
+
+    for numa in report.get("numa", D()).values():
+        yield "numa", str(numa.id), {k: v for k, v in numa.items() if k != "pci_nics"}
+        for pci_id, nic in numa.get("pci_nics", D()).items():
+            yield "pci_nic", pci_id, {"numa": numa.id, **nic}
@@ -0,0 +1,50 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import pathlib
+import re
+import typing
+
+from .tables import TABLES, table_rows
+
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+
+    ARROW_TYPES = {str: pyarrow.string(), int: pyarrow.int64(), bool: pyarrow.bool_()}
+except ImportError:
+    pyarrow = None
+
+
+DIRECTORY = True
+
+
+def render(
+    report, out: typing.TextIO, path: typing.Optional[pathlib.Path] = None, **opts
+):
+    """
+    Write one Parquet file per table and per host in path/<table>/<host>.parquet.
+    Each table directory can be read as a single dataset covering all hosts.
+    Rendering the same host again replaces its files.
+    """
+    if pyarrow is None:
+        raise ValueError("parquet output requires pyarrow")
+    if path is None:
+        raise ValueError("parquet output requires a directory path")
+
+    columns = {t: [[] for _ in cols] for t, cols in TABLES.items()}
+    for table, row in table_rows(report):
+        for values, value in zip(columns[table], row):
+            values.append(value)
+
+    host = re.sub(r"[^\w.-]", "_", report.get("hostname") or "unknown")
+    for table, cols in TABLES.items():
+        schema = pyarrow.schema((name, ARROW_TYPES[t]) for name, t in cols)
+        data = pyarrow.Table.from_arrays(
+            [pyarrow.array(v, type=f.type) for v, f in zip(columns[table], schema)],
+            schema=schema,
+        )
+        d = path / table
+        d.mkdir(exist_ok=True)
+        pyarrow.parquet.write_table(data, d / f"{host}.parquet")
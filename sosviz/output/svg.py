@@ -1,11 +1,199 @@
 # SPDX-License-Identifier: Apache-2.0
 # Copyright (c) 2024 Robin Jarry
 
+import gzip
+import hashlib
+import io
+import os
+import pathlib
 import subprocess
+import sys
+import tempfile
+import time
+import typing
 
+from .detail import DETAIL_LEVELS
 from .dot import SOSGraph
+from .svgcompact import compact_svg, report_size
 
 
-def render(report, **opts):
-    src = SOSGraph(report).source()
-    subprocess.run(["dot", "-T", "svg"], input=src, text=True, check=True)
+DEFAULT_TIMEOUT = 300
+
+
+def render(
+    report,
+    out: typing.TextIO,
+    *,
+    graph: typing.Optional[SOSGraph] = None,
+    cache_dir: typing.Optional[pathlib.Path] = None,
+    detail: typing.Optional[int] = None,
+    timeout: typing.Optional[float] = DEFAULT_TIMEOUT,
+    compress: bool = False,
+    verbose: bool = False,
+    **opts,
+):
+    if graph is None:
+        graph = SOSGraph(report, detail=detail)
+    raw = auto_layout(graph, "svg", timeout, cache_dir)
+    data = compact_svg(raw)
+    if compress:
+        # fixed mtime for reproducible output
+        data = gzip.compress(data, mtime=0)
+    if verbose:
+        report_size("svgz" if compress else "svg", len(raw), len(data))
+    out.flush()
+    out.buffer.write(data)
+    out.buffer.flush()
+
+
+# Layout commands from the most accurate to the cheapest, with the maximum
+# number of nodes and edges for which they are tried first.
+ENGINES = (
+    (5000, ("dot",)),
+    (
+        20000,
+        (
+            "dot",
+            "-Gnslimit=2",
+            "-Gnslimit1=2",
+            "-Gmclimit=0.2",
+            "-Gsearchsize=10",
+        ),
+    ),
+    (None, ("sfdp", "-Goverlap=scale")),
+)
+
+
+def auto_layout(
+    graph: SOSGraph,
+    fmt: str,
+    timeout: typing.Optional[float] = None,
+    cache_dir: typing.Optional[pathlib.Path] = None,
+    collapse: bool = True,
+) -> bytes:
+    """
+    Lay out the graph with the most accurate engine suited to its size. The
+    timeout is an overall limit, shared by all attempts. When a layout takes
+    more than its share of the remaining time, it is killed and retried with
+    the next cheaper engine. As a last resort, the graph is collapsed to the
+    lowest level of detail and laid out with the cheapest engine. The last
+    attempt is never killed so that an image is always produced.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    # walk the graph once to count its nodes and edges, the DOT source is
+    # generated again while it is streamed to the layout process
+    digest = source_digest(graph)
+    size = graph.num_nodes + graph.num_edges
+    engines = [cmd for limit, cmd in ENGINES if limit is None or size <= limit]
+    low = DETAIL_LEVELS["low"]
+    fallback = collapse and graph.collapse.threshold != low
+    attempts = len(engines) + fallback
+
+    for i, cmd in enumerate(engines):
+        budget = None
+        if deadline is not None and i < attempts - 1:
+            budget = max(0, deadline - time.monotonic()) / (attempts - i)
+        try:
+            return cached_layout(graph, digest, fmt, cache_dir, cmd=cmd, timeout=budget)
+        except subprocess.TimeoutExpired:
+            print(
+                f"warning: {cmd[0]} layout of {size} nodes and edges "
+                f"timed out after {budget:.1f}s",
+                file=sys.stderr,
+            )
+
+    graph = SOSGraph(graph.report, graph.index, detail=low)
+    digest = source_digest(graph)
+    return cached_layout(graph, digest, fmt, cache_dir, cmd=engines[-1])
+
+
+class SourceHash(io.TextIOBase):
+    """
+    Text sink which only keeps a hash of what is written in it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.hash = hashlib.sha256()
+
+    def write(self, text: str) -> int:
+        self.hash.update(text.encode())
+        return len(text)
+
+
+def source_digest(graph: SOSGraph) -> str:
+    sink = SourceHash()
+    graph.write(sink)
+    return sink.hash.hexdigest()
+
+
+def cached_layout(
+    graph: SOSGraph,
+    digest: str,
+    fmt: str,
+    cache_dir: typing.Optional[pathlib.Path],
+    *,
+    cmd: typing.Sequence[str] = ("dot",),
+    timeout: typing.Optional[float] = None,
+) -> bytes:
+    """
+    Return the graphviz output for a graph. If cache_dir is set, results are
+    stored in it, keyed by a hash of the layout command, format and digest of
+    the DOT source.
+    """
+    if cache_dir is None:
+        return dot_layout(graph, fmt, cmd, timeout)
+
+    key = hashlib.sha256("\0".join((*cmd, fmt, digest)).encode()).hexdigest()
+    f = cache_dir / f"{key}.{fmt}"
+    try:
+        return f.read_bytes()
+    except FileNotFoundError:
+        pass
+
+    data = dot_layout(graph, fmt, cmd, timeout)
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # concurrent runs may store the same key, make it atomic
+    tmp = f.with_name(f"{f.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, f)
+    return data
+
+
+def dot_layout(
+    graph: SOSGraph,
+    fmt: str,
+    cmd: typing.Sequence[str] = ("dot",),
+    timeout: typing.Optional[float] = None,
+) -> bytes:
+    """
+    Stream the DOT source of the graph into a layout process as it is
+    generated. The process is killed if it does not exit within timeout
+    seconds, source generation included.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    # the output goes to a file, the process cannot block on a full pipe
+    # while its input is being written
+    with tempfile.TemporaryFile() as out:
+        proc = subprocess.Popen(  # pylint: disable=consider-using-with
+            [*cmd, "-T", fmt], stdin=subprocess.PIPE, stdout=out
+        )
+        try:
+            try:
+                with io.TextIOWrapper(proc.stdin, encoding="utf-8") as stdin:
+                    graph.write(stdin)
+            except BrokenPipeError:
+                # the process exited early, its status is checked below
+                pass
+            if deadline is not None:
+                timeout = max(0, deadline - time.monotonic())
+            proc.wait(timeout)
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args)
+        out.seek(0)
+        return out.read()
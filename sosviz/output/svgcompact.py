@@ -0,0 +1,140 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import collections
+import re
+import sys
+
+from ..bits import human_readable
+
+
+def compact_svg(data: bytes) -> bytes:
+    """
+    Reduce the size of an SVG document generated by graphviz without changing
+    how it is drawn:
+
+    - Remove comments, indentation and the anonymous groups around anchors.
+    - Remove trailing zeroes from coordinates and sizes.
+    - Replace repeated sets of presentation attributes (fill, stroke, fonts)
+      with CSS classes defined once in a style element.
+
+    Tooltips are left as is, they must work where scripts are not run.
+    """
+    svg = data.decode("utf-8")
+    svg = COMMENT_RE.sub("", svg)
+    svg = BLANK_RE.sub("><", svg)
+    if svg.count("</a></g>") == len(ANCHOR_GROUP_RE.findall(svg)):
+        svg = ANCHOR_GROUP_RE.sub("<a ", svg)
+        svg = svg.replace("</a></g>", "</a>")
+
+    tags = []
+    styles = collections.Counter()
+    for m in TAG_RE.finditer(svg):
+        name = m.group("name")
+        attrs = dict(ATTR_RE.findall(m.group("attrs")))
+        style = tuple((k, attrs.pop(k)) for k in STYLE_ATTRS if k in attrs)
+        if style:
+            styles[style] += 1
+        tags.append((name, attrs, style, m.group("end")))
+
+    classes = {}
+    for i, (style, count) in enumerate(styles.most_common()):
+        if count < 2:
+            break
+        classes[style] = f"s{i:x}"
+
+    def rewrite(_: re.Match) -> str:
+        name, attrs, style, end = next(it)
+        if style in classes:
+            cls = classes[style]
+            attrs["class"] = f"{attrs['class']} {cls}" if "class" in attrs else cls
+        else:
+            attrs.update(style)
+        out = [f"<{name}"]
+        for k, v in attrs.items():
+            if k in NUMERIC_ATTRS:
+                v = trim_numbers(v)
+            out.append(f' {k}="{v}"')
+        out.append(end)
+        return "".join(out)
+
+    it = iter(tags)
+    svg = TAG_RE.sub(rewrite, svg)
+
+    if classes:
+        rules = []
+        for style, cls in classes.items():
+            props = ";".join(css_property(k, v) for k, v in style)
+            rules.append(f".{cls}{{{props}}}")
+        i = SVG_RE.search(svg).end()
+        svg = f"{svg[:i]}<style>{''.join(rules)}</style>{svg[i:]}"
+
+    return svg.encode("utf-8")
+
+
+COMMENT_RE = re.compile(r"<!--.*?-->\n?", re.DOTALL)
+BLANK_RE = re.compile(r">\s+<")
+SVG_RE = re.compile(r"<svg\b[^>]*>")
+ANCHOR_GROUP_RE = re.compile(r'<g id="a_[^"]*"><a ')
+TAG_RE = re.compile(
+    r'<(?P<name>[a-zA-Z]+)(?P<attrs>(?:\s+[\w:-]+="[^"]*")*)\s*(?P<end>/?>)'
+)
+ATTR_RE = re.compile(r'([\w:-]+)="([^"]*)"')
+STYLE_ATTRS = (
+    "fill",
+    "fill-opacity",
+    "stroke",
+    "stroke-width",
+    "stroke-dasharray",
+    "stroke-opacity",
+    "text-anchor",
+    "font-family",
+    "font-weight",
+    "font-style",
+    "font-size",
+    "text-decoration",
+)
+# presentation attributes which are lengths in user units
+CSS_LENGTHS = {"font-size", "stroke-width"}
+NUMERIC_ATTRS = {
+    "cx",
+    "cy",
+    "d",
+    "font-size",
+    "height",
+    "points",
+    "rx",
+    "ry",
+    "stroke-width",
+    "transform",
+    "viewBox",
+    "width",
+    "x",
+    "x1",
+    "x2",
+    "y",
+    "y1",
+    "y2",
+}
+
+
+def trim_numbers(value: str) -> str:
+    value = re.sub(r"(\d)\.0+(?!\d)", r"\1", value)
+    return re.sub(r"(\.\d*?[1-9])0+(?!\d)", r"\1", value)
+
+
+def css_property(name: str, value: str) -> str:
+    if name in CSS_LENGTHS:
+        value = trim_numbers(value)
+        if re.fullmatch(r"-?[\d.]+", value):
+            value += "px"
+    return f"{name}:{value}"
+
+
+def report_size(what: str, before: int, after: int):
+    saved = 100 * (before - after) // before if before else 0
+    print(
+        f"{what}: {human_readable(before, 1024)}B -> "
+        f"{human_readable(after, 1024)}B ({saved}% smaller)",
+        file=sys.stderr,
+    )
@@ -0,0 +1,13 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import typing
+
+from . import svg
+
+
+def render(report, out: typing.TextIO, **opts):
+    """
+    Same as the svg format, compressed with gzip.
+    """
+    svg.render(report, out, compress=True, **opts)
@@ -0,0 +1,199 @@
+# SPDX-License-Identifier: Apache-2.0
+# Copyright (c) 2024 Robin Jarry
+
+import typing
+
+from ..collect import D
+from ..collect.ip import STATS_RE
+
+
+NETDEV_STATS = tuple(k for k in STATS_RE.groupindex if k != "name")
+OVS_STATS = (
+    "rx_packets",
+    "rx_bytes",
+    "rx_dropped",
+    "rx_errors",
+    "rx_crc_err",
+    "rx_frame_err",
+    "rx_over_err",
+    "rx_missed_errors",
+    "tx_packets",
+    "tx_bytes",
+    "tx_dropped",
+    "tx_errors",
+    "collisions",
+    "ovs_rx_qos_drops",
+    "ovs_tx_failure_drops",
+    "ovs_tx_invalid_hwol_drops",
+    "ovs_tx_mtu_exceeded_drops",
+    "ovs_tx_qos_drops",
+)
+
+# Fixed schema of each table: column names and types. Every table starts with
+# the host name so that tables from several hosts can be concatenated.
+TABLES = {
+    "interfaces": (
+        ("host", str),
+        ("netns", str),
+        ("name", str),
+        ("kind", str),
+        ("state", str),
+        ("mtu", int),
+        ("mac", str),
+        ("master", str),
+        ("device", str),
+        *((s, int) for s in NETDEV_STATS),
+    ),
+    "ovs_ports": (
+        ("host", str),
+        ("bridge", str),
+        ("name", str),
+        ("type", str),
+        ("bond", str),
+        ("admin_state", str),
+        ("link_state", str),
+        ("dpdk_devargs", str),
+        *((s, int) for s in OVS_STATS),
+    ),
+    "ethtool_stats": (
+        ("host", str),
+        ("interface", str),
+        ("counter", str),
+        ("value", int),
+    ),
+    "pmd_rxqs": (
+        ("host", str),
+        ("numa", int),
+        ("core", int),
+        ("port", str),
+        ("rxq", int),
+        ("enabled", bool),
+        ("usage", int),
+    ),
+    "irq_counters": (
+        ("host", str),
+        ("irq", str),
+        ("desc", str),
+        ("cpu", int),
+        ("count", int),
+    ),
+    "vm_vcpus": (
+        ("host", str),
+        ("vm", str),
+        ("vcpu", int),
+        ("cpu", int),
+    ),
+    "numa_memory": (
+        ("host", str),
+        ("numa", int),
+        ("total_memory", int),
+        ("hugepage_size", int),
+        ("hugepages", int),
+    ),
+    "pci_nics": (
+        ("host", str),
+        ("numa", int),
+        ("pci_id", str),
+        ("device", str),
+        ("kernel_driver", str),
+        ("netdev", str),
+        ("pci_bridge", str),
+    ),
+}
+
+
+def int_or_none(value) -> typing.Optional[int]:
+    if value is None:
+        return None
+    return int(value)
+
+
+def table_rows(report: D) -> typing.Iterator[typing.Tuple[str, tuple]]:
+    """
+    Walk the report once and yield (table, row) tuples. Rows of different
+    tables are interleaved. Values are in the order of TABLES columns.
+    """
+    host = report.get("hostname")
+
+    for netns, ifaces in (
+        ("", report.get("interfaces", D())),
+        *report.get("netns", D()).items(),
+    ):
+        for iface in ifaces.values():
+            stats = iface.get("stats", {})
+            yield "interfaces", (
+                host,
+                netns,
+                iface.name,
+                iface.get("kind"),
+                iface.get("state"),
+                int_or_none(iface.get("mtu")),
+                iface.get("mac"),
+                iface.get("master"),
+                iface.get("device"),
+                *(stats.get(s) for s in NETDEV_STATS),
+            )
+
+    for name, dev in report.get("ethtool", D()).items():
+        for counter, value in dev.get("stats", {}).items():
+            # long form, only non-zero counters
+            if value:
+                yield "ethtool_stats", (host, name, counter, value)
+
+    ovs = report.get("ovs", D())
+    for port in ovs.get("ports", D()).values():
+        yield "ovs_ports", ovs_port_row(host, port.bridge, port)
+        for member in port.get("members", D()).values():
+            yield "ovs_ports", ovs_port_row(host, port.bridge, member, port.name)
+    for pmd in ovs.get("pmds", D()).values():
+        for rxq in pmd.rxqs:
+            yield "pmd_rxqs", (
+                host,
+                pmd.numa,
+                pmd.core,
+                rxq.port,
+                rxq.rxq,
+                rxq.enabled,
+                rxq.usage,
+            )
+
+    for irq in report.get("irqs", D()).values():
+        for cpu, count in enumerate(irq.counters):
+            # long form, only non-zero counters
+            if count:
+                yield "irq_counters", (host, irq.irq, irq.get("desc"), cpu, count)
+
+    for vm in report.get("vms", D()).values():
+        for vcpu, cpus in sorted(vm.get("vcpu_pinning", {}).items()):
+            for cpu in sorted(cpus):
+                yield "vm_vcpus", (host, vm.name, vcpu, cpu)
+
+    for numa in report.get("numa", D()).values():
+        hugepages = numa.get("hugepages") or {None: None}
+        for size, num in hugepages.items():
+            yield "numa_memory", (host, numa.id, numa.get("total_memory"), size, num)
+        for nic in numa.get("pci_nics", D()).values():
+            yield "pci_nics", (
+                host,
+                numa.id,
+                nic.pci_id,
+                nic.get("device"),
+                nic.get("kernel_driver"),
+                nic.get("netdev"),
+                nic.get("pci_bridge"),
+            )
+
+
+def ovs_port_row(host: str, bridge: str, port: D, bond: str = None) -> tuple:
+    stats = port.get("stats", {})
+    return (
+        host,
+        bridge,
+        port.name,
+        port.get("type"),
+        bond,
+        port.get("admin_state"),
+        port.get("link_state"),
+        port.get("options", {}).get("dpdk_devargs"),
+        *(stats.get(s) for s in OVS_STATS),
+    )
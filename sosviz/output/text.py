@@ -3,11 +3,12 @@
 
 import os
 import pprint
+import typing
 
 
-def render(report, **opts):
+def render(report, out: typing.TextIO, **opts):
     try:
         width, _ = os.get_terminal_size()
     except OSError:
         width = 100
-    pprint.pprint(report, compact=True, width=width)
+    pprint.pprint(report, stream=out, compact=True, width=width)